@@ -5,9 +5,7 @@
 
 from scrapy import signals
 import requests
-# useful for handling different item types with a single interface
-from itemadapter import is_item, ItemAdapter
-from random import randint
+import random
 
 class BeatportscraperSpiderMiddleware:
     # Not all methods need to be defined. If a method is not defined,
@@ -125,8 +123,7 @@ class ScrapeOpsFakeBrowserHeaders:
         self.header_list = json_response.get("result", [])
 
     def _get_random_header(self):
-        rand_num = randint(0, len(self.header_list)-1)
-        return self.header_list[rand_num]
+        return random.choice(self.header_list)
 
     def process_request(self, request, spider):
         browser_header = self._get_random_header()
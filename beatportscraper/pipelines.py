@@ -4,26 +4,31 @@
 # See: https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 
 
-# useful for handling different item types with a single interface
-from itemadapter import ItemAdapter
+import logging
 import psycopg2
+import psycopg2.extras
+import psycopg2.pool
+import threading
+from twisted.internet import defer, threads
 
+logger = logging.getLogger(__name__)
 
-class BeatportscraperPipeline:
-    def process_item(self, item, spider):
-        adapter = ItemAdapter(item)
-        # join artists
-        artists = adapter.get("track_artist")
-        adapter["track_artist"] = ', '.join(artists)
-
-        # join remixer
-        remixers = adapter.get("track_remixer")
-        if len(remixers) > 0:
-            adapter["track_remixer"] = ', '.join(remixers)
-        else:
-            adapter["track_remixer"] = 'None'
+INSERT_TRACKS = """INSERT INTO tracks (
+                         chart_url,
+                         chart_name,
+                         chart_date,
+                         chart_author,
+                         track_title,
+                         track_artist,
+                         track_label,
+                         track_remixer,
+                         track_genre,
+                         track_bpm,
+                         track_key,
+                         track_date,
+                         track_length_ms 
+                         ) VALUES %s"""
 
-        return item
 
 class SaveToPostgresPipeline:
     
@@ -32,67 +37,102 @@ class SaveToPostgresPipeline:
         return cls(crawler.settings)
     
     def __init__(self, settings):
-        # Start Connection
+        # Start Connection Pool
         hostname = settings.get("POSTGRES_HOSTNAME")
         username = settings.get("POSTGRES_USERNAME")
         password = settings.get("POSTGRES_PASSWORD")
         database = settings.get("POSTGRES_DATABASE")
-        
-        self.connection = psycopg2.connect(host=hostname, user=username, password=password, database=database)
-        self.cur = self.connection.cursor()
+        options = None
+        if not settings.getbool("POSTGRES_SYNCHRONOUS_COMMIT", True):
+            options = "-c synchronous_commit=off"
+
+        pool_size = settings.getint("POSTGRES_POOL_SIZE", 8)
+        self.pool = psycopg2.pool.ThreadedConnectionPool(
+            1,
+            pool_size,
+            host=hostname,
+            user=username,
+            password=password,
+            database=database,
+            options=options,
+        )
+
+        # Rows are buffered and each batch is written in its own transaction
+        self.batch_size = settings.getint("POSTGRES_BATCH_SIZE", 1000)
+        self.buffer = []
+        # getconn() raises instead of blocking when the pool is empty, and the reactor
+        # threadpool has more threads than the pool has connections, so flushes wait here
+        self.connections = threading.BoundedSemaphore(pool_size)
+        # Flushes still running, waited for before the spider is closed
+        self.pending = set()
+
+        connection = self.pool.getconn()
+        cur = connection.cursor()
 
         # Create Table
-        self.cur.execute(""" 
+        cur.execute(""" 
                 CREATE TABLE IF NOT EXISTS tracks(
                 id serial PRIMARY KEY,
                 chart_url TEXT,
-                chart_name VARCHAR(128),
-                chart_date TIMESTAMP,
-                chart_author VARCHAR(128),
-                track_title VARCHAR(128),
-                track_artist VARCHAR(128),
-                track_label VARCHAR(128),
-                track_remixer VARCHAR(128) DEFAULT NULL,
-                track_genre VARCHAR(128),
+                chart_name TEXT,
+                chart_date DATE,
+                chart_author TEXT,
+                track_title TEXT NOT NULL,
+                track_artist TEXT,
+                track_label TEXT,
+                track_remixer TEXT DEFAULT NULL,
+                track_genre TEXT NOT NULL,
                 track_bpm SMALLINT,
-                track_key VARCHAR(128),
-                track_date DATE,
+                track_key TEXT,
+                track_date DATE NOT NULL,
                 track_length_ms INTEGER
             )              
             """)
-        
+
+        # Indexes for the case-insensitive and date range lookups done by main.py
+        for column in ("chart_name", "chart_author"):
+            cur.execute(f"""
+                CREATE INDEX IF NOT EXISTS idx_tracks_{column}_lower
+                ON tracks (lower({column}))
+                """)
+        cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_tracks_track_artist_trgm
+                ON tracks USING gin (track_artist gin_trgm_ops)
+                """)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_tracks_track_date ON tracks (track_date)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_tracks_genre_date ON tracks (lower(track_genre), track_date)")
+        # Matches the features primary key for the anti-join done by pipeline.spotify_pipeline
+        cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_tracks_title_artist_date
+                ON tracks (track_title, track_artist, track_date)
+                """)
+
+        # Chart appearances per track, used by main.by_genre. Refreshed on spider close
+        cur.execute("""
+                CREATE MATERIALIZED VIEW IF NOT EXISTS track_ranking AS
+                SELECT 
+                    track_title,
+                    track_genre,
+                    track_artist,
+                    COUNT(DISTINCT chart_name) AS chart_count
+                FROM tracks GROUP BY track_title, track_genre, track_artist
+            """)
+        cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_track_ranking_genre_count
+                ON track_ranking (lower(track_genre), chart_count DESC)
+                """)
+        cur.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_track_ranking_title_artist_genre
+                ON track_ranking (track_title, track_artist, track_genre)
+                """)
+        connection.commit()
+        cur.close()
+        self.pool.putconn(connection)
 
 
     def process_item(self, item, spider):
-        self.cur.execute("""INSERT INTO tracks (
-                         chart_url,
-                         chart_name,
-                         chart_date,
-                         chart_author,
-                         track_title,
-                         track_artist,
-                         track_label,
-                         track_remixer,
-                         track_genre,
-                         track_bpm,
-                         track_key,
-                         track_date,
-                         track_length_ms 
-                         ) VALUES (
-                            %s,
-                            %s,
-                            %s,
-                            %s,
-                            %s,
-                            %s,
-                            %s,
-                            %s,
-                            %s,
-                            %s,
-                            %s,
-                            %s,
-                            %s 
-                            )""", (
+        self.buffer.append((
                          item["chart_url"],
                          item["chart_name"],
                          item["chart_date"],
@@ -106,12 +146,85 @@ class SaveToPostgresPipeline:
                          item["track_key"],
                          item["track_date"],
                          item["track_length_ms"]
-
                         ))
 
-        self.connection.commit()
+        if len(self.buffer) >= self.batch_size:
+            rows, self.buffer = self.buffer, []
+            # Batches are flushed in a worker thread on their own pooled connection
+            deferred = threads.deferToThread(self._flush, rows)
+            self.pending.add(deferred)
+            deferred.addBoth(self._flushed, deferred)
+            deferred.addCallback(lambda _: item)
+            return deferred
         return item
 
+    def _flushed(self, result, deferred):
+        self.pending.discard(deferred)
+        return result
+
+    def _flush(self, rows):
+        # Insert the rows in a single statement instead of one INSERT per item
+        if not rows:
+            return
+
+        with self.connections:
+            connection = self.pool.getconn()
+            try:
+                self._insert(connection, rows)
+            finally:
+                self.pool.putconn(connection)
+
+    def _insert(self, connection, rows):
+        try:
+            with connection.cursor() as cur:
+                psycopg2.extras.execute_values(cur, INSERT_TRACKS, rows, page_size=self.batch_size)
+            connection.commit()
+        except (psycopg2.DataError, psycopg2.IntegrityError) as error:
+            # A bad row (e.g. a missing track_date) fails the whole statement, so the
+            # batch is inserted again row by row to keep the good rows
+            connection.rollback()
+            logger.warning("Batch of %s tracks failed (%s), inserting row by row", len(rows), error)
+            self._insert_rows(connection, rows)
+        except Exception:
+            connection.rollback()
+            raise
+
+    def _insert_rows(self, connection, rows):
+        # Each row has its own savepoint so a failing row only rolls back itself
+        try:
+            with connection.cursor() as cur:
+                for row in rows:
+                    cur.execute("SAVEPOINT track_row")
+                    try:
+                        psycopg2.extras.execute_values(cur, INSERT_TRACKS, [row])
+                    except (psycopg2.DataError, psycopg2.IntegrityError) as error:
+                        cur.execute("ROLLBACK TO SAVEPOINT track_row")
+                        logger.error("Dropped track %r of %r: %s", row[4], row[0], error)
+                    else:
+                        cur.execute("RELEASE SAVEPOINT track_row")
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+
     def close_spider(self, spider):
-        self.cur.close()
-        self.connection.close()
\ No newline at end of file
+        rows, self.buffer = self.buffer, []
+        # The last rows and the refresh wait for the batches that are still being written
+        deferred = defer.DeferredList(list(self.pending), consumeErrors=True)
+        deferred.addCallback(lambda _: threads.deferToThread(self._close, rows))
+        return deferred
+
+    def _close(self, rows):
+        try:
+            self._flush(rows)
+
+            connection = self.pool.getconn()
+            try:
+                with connection.cursor() as cur:
+                    # The unique index allows refreshing without blocking readers of the view
+                    cur.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY track_ranking")
+                connection.commit()
+            finally:
+                self.pool.putconn(connection)
+        finally:
+            self.pool.closeall()
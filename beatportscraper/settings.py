@@ -30,6 +30,12 @@ POSTGRES_HOSTNAME = credentials["hostname"]
 POSTGRES_USERNAME = credentials["username"]
 POSTGRES_PASSWORD = credentials["password"]
 POSTGRES_DATABASE = credentials["database"]
+POSTGRES_BATCH_SIZE = 1000
+POSTGRES_POOL_SIZE = 8
+# Set to False to let Postgres acknowledge commits before they are flushed to disk. It speeds
+# up large backfills, but a server crash can lose the last committed batches, so only turn it
+# off when the rows can be scraped again
+POSTGRES_SYNCHRONOUS_COMMIT = True
 SCRAPEOPS_API_KEY = credentials["scrapeops_api"]
 SCRAPEOPS_NUM_RES = 5
 SCRAPEOPS_ENPOINT = 'https://headers.scrapeops.io/v1/browser-headers'
@@ -58,14 +64,14 @@ ROBOTSTXT_OBEY = False
 
 
 # Configure maximum concurrent requests performed by Scrapy (default: 16)
-# CONCURRENT_REQUESTS = 1
+CONCURRENT_REQUESTS = 32
 
 # Configure a delay for requests for the same website (default: 0)
 # See https://docs.scrapy.org/en/latest/topics/settings.html#download-delay
 # See also autothrottle settings and docs
 #DOWNLOAD_DELAY = 3
 # The download delay setting will honor only one of:
-#CONCURRENT_REQUESTS_PER_DOMAIN = 16
+CONCURRENT_REQUESTS_PER_DOMAIN = 16
 #CONCURRENT_REQUESTS_PER_IP = 16
 
 # Disable cookies (enabled by default)
@@ -115,30 +121,31 @@ CLOSESPIDER_TIMEOUT_NO_ITEM = 15
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 ITEM_PIPELINES = {
-    "beatportscraper.pipelines.BeatportscraperPipeline": 400,
     "beatportscraper.pipelines.SaveToPostgresPipeline": 500,
 }
 
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
-#AUTOTHROTTLE_ENABLED = True
+AUTOTHROTTLE_ENABLED = True
 # The initial download delay
 #AUTOTHROTTLE_START_DELAY = 5
 # The maximum download delay to be set in case of high latencies
 #AUTOTHROTTLE_MAX_DELAY = 60
 # The average number of requests Scrapy should be sending in parallel to
 # each remote server
-#AUTOTHROTTLE_TARGET_CONCURRENCY = 1.0
+AUTOTHROTTLE_TARGET_CONCURRENCY = 8.0
 # Enable showing throttling stats for every response received:
 #AUTOTHROTTLE_DEBUG = False
 
 # Enable and configure HTTP caching (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html#httpcache-middleware-settings
-#HTTPCACHE_ENABLED = True
+HTTPCACHE_ENABLED = True
 #HTTPCACHE_EXPIRATION_SECS = 0
 #HTTPCACHE_DIR = "httpcache"
 #HTTPCACHE_IGNORE_HTTP_CODES = []
-#HTTPCACHE_STORAGE = "scrapy.extensions.httpcache.FilesystemCacheStorage"
+HTTPCACHE_STORAGE = "scrapy.extensions.httpcache.FilesystemCacheStorage"
+# Revalidate cached pages using their cache headers so new charts are still picked up
+HTTPCACHE_POLICY = "scrapy.extensions.httpcache.RFC2616Policy"
 
 # Set settings whose default value is deprecated to a future-proof value
 REQUEST_FINGERPRINTER_IMPLEMENTATION = "2.7"
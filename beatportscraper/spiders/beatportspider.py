@@ -2,7 +2,13 @@ from typing import Iterable
 import scrapy
 from scrapy.http import Request
 from beatportscraper.items import ChartItem
-import json
+import orjson
+import math
+from urllib.parse import parse_qs, urlparse
+
+
+# Both the chart listing and the chart pages embed their data in this script tag
+NEXT_DATA_CSS = 'script#__NEXT_DATA__::text'
 
 
 class BeatportspiderSpider(scrapy.Spider):
@@ -19,35 +25,47 @@ class BeatportspiderSpider(scrapy.Spider):
         print(self.latest_url)
         
     def parse(self, response):
-        charts = response.css('div.gLzgks')
-        for chart in charts:
-            relative_url = chart.css('a.artwork::attr(href)').get()
-            chart_url = 'https://www.beatport.com' + relative_url
+        # The listing page embeds the same __NEXT_DATA__ blob as the chart pages,
+        # which is more stable than the hashed CSS classes of the rendered page
+        script_tag = response.css(NEXT_DATA_CSS).get()
+        json_blob = orjson.loads(script_tag)
+        queries = json_blob["props"]["pageProps"]["dehydratedState"]["queries"]
+        listing = next(
+            (
+                query["state"]["data"] for query in queries
+                if "results" in (query["state"]["data"] or {})
+            ),
+            None,
+        )
+        if listing is None:
+            # Raising StopIteration here would surface as a RuntimeError of the generator
+            self.logger.error("No chart listing found in __NEXT_DATA__ of %s", response.url)
+            return
+
+        for chart in listing["results"]:
+            chart_url = f'https://www.beatport.com/chart/{chart["slug"]}/{chart["id"]}'
             yield response.follow(chart_url, callback=self.parse_charts)
 
-        xpath_string = """
-                        //div[@class='Pager-style__Container-sc-47555d13-6 clQVTn pages']/
-                        div[@class='Pager-style__PageNavItems-sc-47555d13-0 hSa-dTg']/
-                        a[@class='Pager-style__Page-sc-47555d13-1 dCarVQ active']/
-                        following::a/@href
-                    """
-        next_page = response.xpath(xpath_string).get()
-        print(f"**********{next_page}************")
-        if next_page is not None:
-            next_page_url = 'https://www.beatport.com' + next_page
-            yield response.follow(next_page_url, callback=self.parse)
+        # Every remaining page is scheduled from the first one instead of
+        # following the pager one page at a time
+        query_params = parse_qs(urlparse(response.url).query)
+        page = int(query_params.get("page", ["1"])[0])
+        if page == 1:
+            per_page = int(listing["per_page"])
+            num_pages = math.ceil(int(listing["count"]) / per_page)
+            for next_page in range(2, num_pages + 1):
+                next_page_url = f'https://www.beatport.com/charts/all?page={next_page}&per_page={per_page}'
+                yield response.follow(next_page_url, callback=self.parse)
 
     
     def parse_charts(self, response):
         chart_items = ChartItem()
-        script_tag = response.css('script#__NEXT_DATA__::text').get()
-        json_blob = json.loads(script_tag)
+        script_tag = response.css(NEXT_DATA_CSS).get()
+        json_blob = orjson.loads(script_tag)
         tracks = json_blob["props"]["pageProps"]["dehydratedState"]["queries"][1]["state"]["data"]["results"]
         chart = json_blob["props"]["pageProps"]["dehydratedState"]["queries"][0]["state"]["data"]
         for track in tracks:
             chart_items = ChartItem()
-            remixer_list = []
-            artist_list = []
             chart_items["chart_url"] = response.url
             chart_items["chart_name"] = chart["name"]
             chart_items["chart_date"] = chart["publish_date"]
@@ -55,24 +73,16 @@ class BeatportspiderSpider(scrapy.Spider):
             chart_items["track_title"] = track["name"]
             chart_items["track_label"] = track["release"]["label"]["name"]
 
-            for artist in track["artists"]:
-                artist_list.append(artist["name"])
-            chart_items["track_artist"] = artist_list
+            chart_items["track_artist"] = ', '.join(artist["name"] for artist in track["artists"])
 
-            try:
-                for remixer in track["remixers"]:
-                    remixer_list.append(remixer["name"])
-                chart_items["track_remixer"] = remixer_list
-            except KeyError:
-                chart_items["track_remixer"] = None
+            remixers = track.get("remixers") or []
+            chart_items["track_remixer"] = ', '.join(remixer["name"] for remixer in remixers) or 'None'
 
             chart_items["track_genre"] = track["genre"]["name"]
             chart_items["track_bpm"] = track["bpm"]
 
-            try:
-                chart_items["track_key"] = track["key"]["name"]
-            except TypeError:
-                chart_items["track_key"] = None
+            key = track.get("key")
+            chart_items["track_key"] = key["name"] if key else None
 
             chart_items["track_date"] = track["publish_date"]
             chart_items["track_length_ms"] = track["length_ms"]
@@ -1,11 +1,108 @@
 import src.spotify_client as spotify_client
+import src.postgres_client as postgres_client
 import psycopg2
 import psycopg2.extras
 import os
-import json
 import argparse
-import random
-from collections.abc import Generator
+import logging
+import itertools
+import calendar
+import datetime
+
+logger = logging.getLogger(__name__)
+
+# SQL queries are built once at import time so every call sends the same statement
+_CHART_Q = """
+    SELECT
+        chart_name,
+        chart_author,
+        track_title AS title,
+        track_artist AS artist,
+        track_date AS "year"
+    FROM tracks
+    WHERE lower(chart_name) = lower(%s)
+    AND lower(chart_author) = lower(%s);
+"""
+
+_AUTHOR_Q = """
+    SELECT
+        chart_name,
+        chart_author,
+        chart_date,
+        track_title AS title,
+        track_artist AS artist,
+        track_date AS "year"
+    FROM tracks
+    WHERE lower(chart_author) = lower(%s)
+    ORDER BY chart_date, chart_name, chart_author;
+"""
+
+# Sampling is done by Postgres so only `limit` rows are transferred
+_ARTIST_Q_TEMPLATE = """
+    SELECT * FROM (
+        SELECT
+            DISTINCT track_title AS title,
+            track_artist AS artist,
+            track_date AS "year"
+        FROM tracks
+        WHERE track_artist ILIKE %s {date_filter}
+    ) AS artist_tracks
+    ORDER BY random()
+    LIMIT %s;
+"""
+_ARTIST_Q = _ARTIST_Q_TEMPLATE.format(date_filter="")
+_ARTIST_Q_RANGE = _ARTIST_Q_TEMPLATE.format(
+    date_filter="AND track_date BETWEEN %s AND %s"
+)
+
+# Ordering and limiting is done by Postgres so only `limit` rows are transferred
+_GENRE_Q_TEMPLATE = """
+    SELECT * FROM (
+        SELECT
+            DISTINCT t.track_title AS title,
+            t.track_artist AS artist,
+            t.track_genre,
+            r.chart_count,
+            t.track_date AS "year"
+        FROM tracks t
+        JOIN track_ranking r
+            ON t.track_title = r.track_title
+            AND t.track_artist = r.track_artist
+            AND t.track_genre = r.track_genre
+        WHERE lower(t.track_genre) = lower(%s) {date_filter}
+    ) AS genre_tracks
+    ORDER BY {order_by}
+    LIMIT %s;
+"""
+_GENRE_ORDER = {"top": "chart_count DESC", "random": "random()"}
+_GENRE_Q = {
+    mode: _GENRE_Q_TEMPLATE.format(date_filter="", order_by=order_by)
+    for mode, order_by in _GENRE_ORDER.items()
+}
+_GENRE_Q_RANGE = {
+    mode: _GENRE_Q_TEMPLATE.format(
+        date_filter="AND t.track_date BETWEEN %s AND %s", order_by=order_by
+    )
+    for mode, order_by in _GENRE_ORDER.items()
+}
+
+
+def month_bounds(month_range: list) -> tuple:
+    """
+    Summary: Converts a range of months into the first and last day of the range
+
+    Args:
+        month_range (list): a list containing the string literals of the bounding
+            months [20YY-MM, 20YY-MM].
+
+    Returns:
+        tuple: a tuple (datetime.date, datetime.date) of the first day of the
+            starting month and the last day of the ending month
+    """
+    start = datetime.date.fromisoformat(f"{month_range[0]}-01")
+    year, month = map(int, month_range[1].split("-"))
+    end = datetime.date(year, month, calendar.monthrange(year, month)[1])
+    return (start, end)
 
 
 def by_chart(cur: psycopg2.extras.RealDictCursor, chart_details: tuple) -> tuple:
@@ -24,20 +121,7 @@ def by_chart(cur: psycopg2.extras.RealDictCursor, chart_details: tuple) -> tuple
             second item (str) is a string literal of the playlist title that will
             be supplied to the Spotify API.
     """
-    # SQL query
-    query = """
-                SELECT 
-                    chart_name,
-                    chart_author,
-                    track_title AS title,
-                    track_artist AS artist,
-                    track_date AS "year"
-                FROM tracks
-                WHERE chart_name ILIKE %s
-                AND chart_author ILIKE %s;
-            """
-
-    cur.execute(query, chart_details)
+    cur.execute(_CHART_Q, chart_details)
     tracks = cur.fetchall()
 
     title = f"{tracks[0]['chart_name']} by {tracks[0]['chart_author']}"
@@ -69,37 +153,20 @@ def by_artist(
             The second item (str) is a string literal of the playlist title that
             will be supplied to the Spotify API.
     """
-    # SQL query
+    # ILIKE substring matches are served by the trigram index on track_artist.
+    # LIKE wildcards in the artist name are escaped so they match literally
+    pattern = "%{}%".format(
+        artist.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    )
     if month_range:
-        query = """
-                    SELECT 
-                        DISTINCT track_title as title, 
-                        track_artist as artist,
-                        track_date AS year
-                    FROM tracks
-                    WHERE strpos(track_artist, %s) > 0
-                    AND track_date BETWEEN %s AND %s;
-                """
-        cur.execute(query, (artist, f"{month_range[0]}-01", f"{month_range[1]}-31"))
+        start, end = month_bounds(month_range)
+        cur.execute(_ARTIST_Q_RANGE, (pattern, start, end, limit))
     else:
-        query = """
-                    SELECT 
-                        DISTINCT track_title AS title, 
-                        track_artist AS artist,
-                        track_date AS "year"
-                    FROM tracks
-                    WHERE strpos(track_artist, %s) > 0;
-                """
-        cur.execute(query, (artist,))
-
-    tracks = cur.fetchall()
+        cur.execute(_ARTIST_Q, (pattern, limit))
 
-    try:
-        limited_tracks = random.sample(tracks, limit)
-    except ValueError:
-        limited_tracks = tracks
+    limited_tracks = cur.fetchall()
 
-    title = f"Tracks by {tracks[0]['artist']}"
+    title = f"Tracks by {limited_tracks[0]['artist']}"
 
     return (limited_tracks, title)
 
@@ -133,110 +200,46 @@ def by_genre(
             The second item (str) is a string literal of the playlist title that
             will be supplied to the Spotify API.
     """
-    # SQL query
     if month_range:
-        query = """
-                    WITH ranking AS (
-                    SELECT 
-                        track_title,
-                        track_genre,
-                        track_artist,
-                        COUNT(DISTINCT chart_name) AS chart_count
-                    FROM tracks GROUP BY track_title, track_genre, track_artist
-                    ORDER BY COUNT(DISTINCT chart_name) DESC 
-                    )
-
-                    SELECT 
-                        DISTINCT t.track_title AS title, 
-                        t.track_artist AS artist,
-                        t.track_genre,
-                        r.chart_count,
-                        track_date AS "year"
-                    FROM tracks t
-                    JOIN ranking r
-                        ON t.track_title = r.track_title
-                        and t.track_artist = r.track_artist
-                    WHERE t.track_genre ILIKE %s
-                    AND t.track_date BETWEEN %s AND %s
-                    ORDER BY r.chart_count DESC;
-                """
-        cur.execute(query, (genre, f"{month_range[0]}-01", f"{month_range[1]}-31"))
+        start, end = month_bounds(month_range)
+        cur.execute(_GENRE_Q_RANGE[mode], (genre, start, end, limit))
     else:
-        query = """
-                    WITH ranking AS (
-                    SELECT 
-                        track_title,
-                        track_genre,
-                        track_artist,
-                        COUNT(DISTINCT chart_name) AS chart_count
-                    FROM tracks GROUP BY track_title, track_genre, track_artist
-                    ORDER BY COUNT(DISTINCT chart_name) DESC 
-                    )
-
-                    SELECT 
-                        DISTINCT t.track_title AS title, 
-                        t.track_artist AS artist,
-                        t.track_genre,
-                        r.chart_count,
-                        track_date AS "year"
-                    FROM tracks t
-                    JOIN ranking r
-                        ON t.track_title = r.track_title
-                        and t.track_artist = r.track_artist
-                    WHERE t.track_genre ILIKE %s
-                    ORDER BY r.chart_count DESC;
-                """
-        cur.execute(query, (genre,))
-
-    tracks = cur.fetchall()
+        cur.execute(_GENRE_Q[mode], (genre, limit))
 
-    if mode == "top":
-        limited_tracks = tracks[:limit]
-    elif mode == "random":
-        try:
-            limited_tracks = random.sample(tracks, limit)
-        except ValueError:
-            limited_tracks = tracks
+    limited_tracks = cur.fetchall()
 
-    title = f"{tracks[0]['track_genre']} Genre Tracks ({mode})"
+    title = f"{limited_tracks[0]['track_genre']} Genre Tracks ({mode})"
 
     return (limited_tracks, title)
 
 
-def by_author(
-    cur: psycopg2.extras.RealDictCursor, chart_author: str
-) -> Generator[tuple, None, None]:
+def by_author(cur: psycopg2.extras.RealDictCursor, chart_author: str) -> list:
     """
-    Summary: Retrieves all charts of a specified chart author from a Postgres database.
+    Summary: Retrieves the tracks of all charts of a specified chart author from a
+        Postgres database. All charts are fetched with a single query and grouped
+        per chart afterwards.
 
     Args:
         cur (psycopg2.extensions.RealDictCursor): A pscyopg2 dictionary-like cursor.
             The attributes of the retrieved records from queries can be accessed
             similar to Python dictionaries.
-        genre (str): string literal of the specified chart author.
+        chart_author (str): string literal of the specified chart author.
 
-    Yields:
-        tuple: returns a tuple (str, str). The first item contains the chart name while
-            the second items contains the chart author name
+    Returns:
+        list: a list of (list, str) tuples, one for each chart ordered by chart date.
+            The first item (list) contains the details [title, artist, year] of each
+            track in the chart. The second item (str) is a string literal of the
+            playlist title that will be supplied to the Spotify API.
     """
-    query = """
-                SELECT 
-                    chart_name, 
-                    chart_author, 
-                    chart_date
-                FROM tracks
-                GROUP BY 
-                    chart_name, 
-                    chart_author, 
-                    chart_date
-                HAVING chart_author ILIKE %s
-                ORDER BY chart_date; 
-            """
-
-    cur.execute(query, (chart_author,))
-    charts = cur.fetchall()
-    for chart in charts:
-        yield (chart["chart_name"], chart_author)
+    cur.execute(_AUTHOR_Q, (chart_author,))
+    tracks = cur.fetchall()
+
+    charts = []
+    for (chart_name, author), chart_tracks in itertools.groupby(
+        tracks, key=lambda track: (track["chart_name"], track["chart_author"])
+    ):
+        charts.append((list(chart_tracks), f"{chart_name} by {author}"))
+    return charts
 
 
 if __name__ == "__main__":
@@ -325,20 +328,24 @@ if __name__ == "__main__":
         help="Creates a playlist from recommendations based on tracks that should have been originally added",
     )
 
+    global_parser.add_argument(
+        "-d",
+        "--debug",
+        action="store_true",
+        help="Shows the debug output of the Spotify API requests",
+    )
+
     # PARSE ARGUMENTS
     args = global_parser.parse_args()
 
+    logging.basicConfig(
+        level=logging.DEBUG if args.debug else logging.INFO, format="%(message)s"
+    )
+
     # Postgres Connection
     credentials_path = os.path.join(os.path.dirname(__file__), "credentials.json")
-    with open(credentials_path, "r") as f:
-        credentials = json.load(f)
-
-    conn = psycopg2.connect(
-        dbname=credentials["database"],
-        user=credentials["username"],
-        host=credentials["hostname"],
-        password=credentials["password"],
-    )
+    pool = postgres_client.get_pool(credentials_path)
+    conn = pool.getconn()
     cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
     # BODY
@@ -349,10 +356,7 @@ if __name__ == "__main__":
             chart_details = (args.title, args.author)
             track_title_list = [by_chart(cur=cur, chart_details=chart_details)]
         case "author":
-            chart_details = by_author(cur=cur, chart_author=args.author)
-            for chart_detail in chart_details:
-                tracks, title = by_chart(cur=cur, chart_details=chart_detail)
-                track_title_list.append((tracks, title))
+            track_title_list = by_author(cur=cur, chart_author=args.author)
         case "artist":
             track_title_list = [
                 by_artist(
@@ -374,31 +378,41 @@ if __name__ == "__main__":
             ]
 
     # Spotify API
-    app = spotify_client.SpotifyClient.get_credentials(credentials_path)
+    app = spotify_client.SpotifyClient.get_credentials(
+        credentials_path, credentials=postgres_client.load_credentials(credentials_path)
+    )
 
     for track_title in track_title_list:
-        track_id_list = []
         tracks, title = track_title[0], track_title[1]
 
-        for track in tracks:
-            if track_id := app.search_track(market="PH", song_details=track):
-                track_id_list.append(track_id)
-
-        if args.recommendation is True:
-            reco_track_ids = app.get_recommendations(
-                market="PH", track_ids=track_id_list, limit=30
-            )
-            title = title + " (recommendations)"
-            playlist_id = app.create_playlist(
-                title, "Playlist created through Spotify API"
-            )
-            app.add_track(playlist_id=playlist_id, track_id_list=reco_track_ids)
-        else:
-            playlist_id = app.create_playlist(
-                title, "Playlist created through Spotify API"
-            )
-            app.add_track(playlist_id=playlist_id, track_id_list=track_id_list)
+        track_id_list = app.search_tracks(market="PH", songs=tracks)
+
+        # Skip playlists that would be left empty
+        if not track_id_list:
+            logger.info("No tracks of %s were found in Spotify", title)
+            continue
+
+        # A failed playlist is logged so the remaining playlists are still created
+        try:
+            if args.recommendation is True:
+                reco_track_ids = app.get_recommendations(
+                    market="PH", track_id_list=track_id_list, limit=30
+                )
+                title = title + " (recommendations)"
+                playlist_id = app.create_playlist(
+                    title, "Playlist created through Spotify API"
+                )
+                app.add_track(playlist_id=playlist_id, track_id_list=reco_track_ids)
+            else:
+                playlist_id = app.create_playlist(
+                    title, "Playlist created through Spotify API"
+                )
+                app.add_track(playlist_id=playlist_id, track_id_list=track_id_list)
+        except spotify_client.SpotifyException as e:
+            logger.error("Could not create playlist %s: %s", title, e)
 
     # Close connection after running script
+    app.close()
     cur.close()
-    conn.close()
+    pool.putconn(conn)
+    pool.closeall()
@@ -1,16 +1,38 @@
 import os
-import json
+import io
+import logging
 import psycopg2
 import psycopg2.extras
+import psycopg2.pool
 import concurrent.futures
-import itertools
+import functools
+import operator
 import time
+from collections.abc import Generator
 
 import src.spotify_client as spotify_client
+import src.postgres_client as postgres_client
 from beatportscraper.spiders.beatportspider import BeatportspiderSpider
 from scrapy.crawler import CrawlerProcess
 from scrapy.utils.project import get_project_settings
 
+logger = logging.getLogger(__name__)
+
+# Columns of the features table in insertion order
+FEATURES_COLUMNS = (
+    "track_title",
+    "track_artist",
+    "track_year",
+) + spotify_client.AUDIO_FEATURES
+
+# Keys of the dictionaries built by chunk_features, in the order of FEATURES_COLUMNS
+FEATURES_KEYS = ("postgres_title", "postgres_artist", "postgres_year") + FEATURES_COLUMNS[3:]
+
+# Every key is present with a None default so rows can be built with a single itemgetter
+FEATURES_DEFAULTS = dict.fromkeys(FEATURES_KEYS)
+
+features_row = operator.itemgetter(*FEATURES_KEYS)
+
 
 def beatport_pipeline():
     """
@@ -27,6 +49,8 @@ def spotify_pipeline(
     conn: psycopg2.extensions.connection,
     cur: psycopg2.extras.RealDictCursor,
     app: spotify_client.SpotifyClient,
+    pool: psycopg2.pool.ThreadedConnectionPool,
+    limit: int = 1000,
 ) -> None:
     """
     Summary: Pipeline of the spotify API. It retrieves records of track title
@@ -41,28 +65,58 @@ def spotify_pipeline(
             The attributes of the retrieved records from queries can be accessed
             similar to Python dictionaries.
         app (spotify_client.SpotifyClient): A spotify_client SpotifyCLient class.
+        pool (psycopg2.pool.ThreadedConnectionPool): A pool of Postgres connections.
+            Each chunk of results is inserted through its own pooled connection.
+        limit (int): maximum number of tracks searched per run.
     """
     cur.execute(
         """ 
             CREATE TABLE IF NOT EXISTS features(
-                track_title VARCHAR(128) NOT NULL,
-				track_artist VARCHAR(128) NOT NULL,
+                track_title TEXT NOT NULL,
+				track_artist TEXT NOT NULL,
                 track_year DATE NOT NULL,
-                acousticness NUMERIC,
-                danceability NUMERIC,
-                energy NUMERIC,
-                instrumentalness NUMERIC,
-                liveness NUMERIC,
-                loudness NUMERIC,
-                speechiness NUMERIC,
-                tempo NUMERIC,
-                time_signature INT,
-                valence NUMERIC,
+                acousticness REAL,
+                danceability REAL,
+                energy REAL,
+                instrumentalness REAL,
+                liveness REAL,
+                loudness REAL,
+                speechiness REAL,
+                tempo REAL,
+                time_signature SMALLINT,
+                valence REAL,
 				UNIQUE(track_title, track_artist),
 				PRIMARY KEY(track_title, track_artist, track_year)
             );              
         """
     )
+    # Tables created with NUMERIC features, an INT time_signature, or VARCHAR(128) titles
+    # and artists are converted once. tracks stores titles and artists as TEXT, so a
+    # longer value would otherwise fail the insert of its whole chunk on every run
+    cur.execute(
+        """
+            SELECT column_name FROM information_schema.columns
+            WHERE table_name = 'features'
+            AND (data_type = 'numeric'
+                OR (column_name = 'time_signature' AND data_type = 'integer')
+                OR (column_name IN ('track_title', 'track_artist')
+                    AND data_type = 'character varying'))
+        """
+    )
+    old_columns = [row["column_name"] for row in cur.fetchall()]
+    if old_columns:
+        column_types = {
+            "track_title": "TEXT",
+            "track_artist": "TEXT",
+            "time_signature": "SMALLINT",
+        }
+        cur.execute(
+            "ALTER TABLE features "
+            + ", ".join(
+                f"ALTER COLUMN {column} TYPE {column_types.get(column, 'REAL')}"
+                for column in old_columns
+            )
+        )
     get_query = """
                 SELECT DISTINCT 
                 t.track_title as title,
@@ -77,189 +131,267 @@ def spotify_pipeline(
                     WHERE t.track_artist = f.track_artist
                     AND t.track_title = f.track_title
                     AND t.track_date = f.track_year)
-                LIMIT 1000;
+                LIMIT %s;
              """
-    # results are limited to 1000 because of the possibility of soft ban due to large number of requests
+    # results are limited because of the possibility of soft ban due to large number of requests.
+    # A rate limited response pauses every search thread, so larger limits can be passed safely
 
-    cur.execute(get_query)
-    tracks = cur.fetchall()
+    # Search endpoint is somewhat more lenient to large number of requests than track features
+    executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=spotify_client.MAX_CONCURRENT_REQUESTS
+    )
 
-    iter_app = itertools.repeat(app)
+    # Rows are streamed from a server-side cursor in batches of itersize instead of
+    # being fetched all at once. DictCursor rows are lists sharing one column index,
+    # which is lighter than building a dictionary per row while keeping key access
+    with conn.cursor(
+        name="track_stream", cursor_factory=psycopg2.extras.DictCursor
+    ) as track_cur:
+        track_cur.itersize = 500
+        track_cur.execute(get_query, (limit,))
+
+        # Rows with the same search cache key share one search, so an in-run duplicate is
+        # exactly a cache hit. The key ignores letter case and surrounding whitespace, and
+        # only keeps the year of the date since the search query only filters on the year.
+        # Every row is submitted here, so the cursor can be closed before the first commit below
+        search = functools.partial(app.search_track, "PH")
+        searches = {}
+        pending = []
+        for track in track_cur:
+            key = spotify_client.SpotifyCache._search_key(track)
+            if key not in searches:
+                searches[key] = executor.submit(search, track)
+            pending.append((track, searches[key]))
+
+    # Search results in the same order as the rows, as a tuple of the track title,
+    # track artist, track year, and Spotify track ID
+    results = search_results(pending)
+
+    # The features table must be visible to the pooled connections
+    conn.commit()
+
+    # Each chunk of 100 search results has its features retrieved and inserted by a
+    # writer with its own pooled connection while the remaining searches are still
+    # running in the thread pool
+    chunksize = 100
+    writer = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+    store = functools.partial(store_chunk, app=app, pool=pool)
+    with executor, writer:
+        futures = []
+        chunk = []
+        for result in results:
+            chunk.append(result)
+            if len(chunk) == chunksize:
+                futures.append(writer.submit(store, chunk))
+                chunk = []
+        if chunk:
+            futures.append(writer.submit(store, chunk))
 
-    search_requests = []
+        # Surface errors raised inside the writers
+        for future in futures:
+            future.result()
 
-    # Search endpoint is somewhat more lenient to large number of requests than track features
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        results = executor.map(search_retrieve, tracks, iter_app)
+    # Keep the planner statistics of the anti-join current for the next run
+    cur.execute("ANALYZE features")
+    conn.commit()
 
-        for result in results:
-            search_requests.append(result)
 
-    chunksize = 100
-    id_chunks = [
-        search_requests[i : i + chunksize]
-        for i in range(0, len(search_requests), chunksize)
-    ]
-
-    for chunk in id_chunks:
-        no_id_list = []
-        for i, track in enumerate(chunk):
-            if track[3] is None:
-                no_id_list.append(chunk[i])
-
-        chunk = [track for track in chunk if track not in no_id_list]
-
-        # Insert tracks that were not found
-        for no_id in no_id_list:
-            no_id_features = {
-                "postgres_title": no_id[0],
-                "postgres_artist": no_id[1],
-                "postgres_year": no_id[2],
-            }
-            insert_data(no_id_features, conn, cur)
-
-        # Get track features of tracks that were found then insert them
-        unzipped = list(zip(*chunk))
-        postgres_titles, postgres_artists, postgres_years, track_id_list = (
-            unzipped[0],
-            unzipped[1],
-            unzipped[2],
-            unzipped[3],
-        )
-        for title, artist, year, feature in zip(
-            postgres_titles,
-            postgres_artists,
-            postgres_years,
-            app.get_track_features(track_id_list),
-        ):
-            feature["postgres_title"] = title
-            feature["postgres_artist"] = artist
-            feature["postgres_year"] = year
-            insert_data(feature, conn, cur)
-
-
-def search_retrieve(
-    track_details: dict,
+def search_results(pending: list) -> Generator[tuple, None, None]:
+    """
+    Summary: Waits for the searches of the rows in order. Rows whose search failed with a
+        SpotifyException are skipped instead of stopping the pipeline. They are not inserted
+        into the features table, so they are searched again on the next run.
+
+    Args:
+        pending (list): a list of (row, future) tuples of the submitted searches.
+
+    Yields:
+        tuple: the track title, track artist, track year, and Spotify track ID of each row
+    """
+    for track, future in pending:
+        try:
+            track_id = future.result()
+        except spotify_client.SpotifyException as error:
+            logger.error("%s: %s", type(error).__name__, error)
+            continue
+        yield track["title"], track["artist"], track["year"], track_id
+
+
+def store_chunk(
+    chunk: list,
     app: spotify_client.SpotifyClient,
-) -> tuple:
+    pool: psycopg2.pool.ThreadedConnectionPool,
+) -> None:
     """
-    Summary: Searches tracks through the SpotifyClient.search_track function.
+    Summary: Retrieves the audio features of a chunk of search results and inserts
+        them using a connection taken from the pool. A chunk whose features could not be
+        retrieved is skipped, so its tracks are searched again on the next run.
 
     Args:
-        track_details (dict): a dictionary containing the values of
-            "title", "year", and "artist".
+        chunk (list): a list of (title, artist, year, Spotify track ID) tuples.
         app (spotify_client.SpotifyClient): A spotify_client SpotifyCLient class.
+        pool (psycopg2.pool.ThreadedConnectionPool): A pool of Postgres connections.
+    """
+    try:
+        features_list = chunk_features(chunk, app)
+    except spotify_client.SpotifyException as error:
+        logger.error("%s: %s", type(error).__name__, error)
+        return
+
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            insert_data(features_list, conn, cur)
+    finally:
+        pool.putconn(conn)
+
+
+def chunk_features(
+    chunk: list,
+    app: spotify_client.SpotifyClient,
+) -> list:
+    """
+    Summary: Retrieves the audio features of a chunk of search results. Tracks that
+        were not found in Spotify are returned without audio features.
+
+    Args:
+        chunk (list): a list of (title, artist, year, Spotify track ID) tuples. The maximum
+            number of tuples in the list is 100.
+        app (spotify_client.SpotifyClient): A spotify_client SpotifyCLient class.
+
+    Returns:
+        list: a list of dictionaries containing the audio features of each track
+            together with its "postgres_title", "postgres_artist", and "postgres_year".
+            Every dictionary has all FEATURES_KEYS, missing features are None
+    """
+    features_list = []
+
+    # Split the chunk into found and not found tracks in a single pass
+    found, no_id_list = [], []
+    for track in chunk:
+        (no_id_list if track[3] is None else found).append(track)
+    chunk = found
+
+    # Tracks that were not found are stored without features
+    for no_id in no_id_list:
+        no_id_features = dict(FEATURES_DEFAULTS)
+        no_id_features["postgres_title"] = no_id[0]
+        no_id_features["postgres_artist"] = no_id[1]
+        no_id_features["postgres_year"] = no_id[2]
+        features_list.append(no_id_features)
+
+    if not chunk:
+        return features_list
+
+    # Get track features of tracks that were found
+    track_id_list = [track[3] for track in chunk]
+    for (title, artist, year, _), feature in zip(
+        chunk, app.get_track_features(track_id_list)
+    ):
+        feature = {**FEATURES_DEFAULTS, **feature}
+        feature["postgres_title"] = title
+        feature["postgres_artist"] = artist
+        feature["postgres_year"] = year
+        features_list.append(feature)
+
+    return features_list
+
+
+def _copy_value(value) -> str:
+    """
+    Summary: Formats a value for the text format of COPY
+
+    Args:
+        value: the value of a column
 
     Returns:
-        tuple: A tuple containing the track title, track artist, track year,
-            and Spotify track ID
+        str: the escaped value, or \\N if the value is None
     """
-    sptfy_track_id = app.search_track(market="PH", song_details=track_details)
+    if value is None:
+        return "\\N"
     return (
-        track_details["title"],
-        track_details["artist"],
-        track_details["year"],
-        sptfy_track_id,
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
     )
 
 
 def insert_data(
-    track_features: dict,
+    features_list: list,
     conn: psycopg2.extensions.connection,
-    cur: psycopg2.extras.RealDictCursor,
+    cur: psycopg2.extensions.cursor,
 ) -> None:
     """
-    Summary: Inserts the audio features into the Postgres database
+    Summary: Inserts the audio features into the Postgres database. The rows are
+        loaded with COPY into the features_staging temporary table, then moved into
+        features with a single INSERT ... SELECT and committed once. Rows that conflict
+        with tracks already in the table are skipped.
 
     Args:
-        track_features (dict): a dictionary containing the audio features
+        features_list (list): a list of dictionaries containing every key of FEATURES_KEYS
         conn (psycopg2.extensions.connection): A psycopg2 connection class.
-        cur (psycopg2.extensions.RealDictCursor): A pscyopg2 dictionary-like cursor.
-            The attributes of the retrieved records from queries can be accessed
-            similar to Python dictionaries.
+        cur (psycopg2.extensions.cursor): A psycopg2 cursor of conn.
     """
+    rows = map(features_row, features_list)
+
+    # Rows are loaded with COPY into a staging table, then moved into features so
+    # that rows conflicting with existing tracks can still be skipped
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(_copy_value(value) for value in row) + "\n")
+    buffer.seek(0)
+
     try:
         cur.execute(
             """
-                INSERT INTO features (
-                    track_title,
-                    track_artist,
-                    track_year,
-                    acousticness,
-                    danceability,
-                    energy,
-                    instrumentalness,
-                    liveness,
-                    loudness,
-                    speechiness,
-                    tempo,
-                    time_signature,
-                    valence
-                    ) VALUES (
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s
-                    )""",
-            (
-                track_features.get("postgres_title"),
-                track_features.get("postgres_artist"),
-                track_features.get("postgres_year"),
-                track_features.get("acousticness", None),
-                track_features.get("danceability", None),
-                track_features.get("energy", None),
-                track_features.get("instrumentalness", None),
-                track_features.get("liveness", None),
-                track_features.get("loudness", None),
-                track_features.get("speechiness", None),
-                track_features.get("tempo", None),
-                track_features.get("time_signature", None),
-                track_features.get("valence", None),
-            ),
+                CREATE TEMP TABLE IF NOT EXISTS features_staging
+                (LIKE features INCLUDING DEFAULTS)
+                ON COMMIT DELETE ROWS
+            """
+        )
+        cur.copy_from(buffer, "features_staging", columns=FEATURES_COLUMNS)
+        cur.execute(
+            f"""
+                INSERT INTO features ({", ".join(FEATURES_COLUMNS)})
+                SELECT {", ".join(FEATURES_COLUMNS)} FROM features_staging
+                ON CONFLICT DO NOTHING
+            """
         )
     except Exception as error:
-        print(f"{type(error).__name__}: {error}")
-        print("Query:", cur.query)
+        logger.error("%s: %s", type(error).__name__, error)
+        logger.error("Query: %s", cur.query)
         conn.rollback()
     else:
         conn.commit()
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
     start = time.perf_counter()
 
     # Connection with Postgres and Spotify App
     credentials_path = os.path.join(os.path.dirname(__file__), "credentials.json")
-    with open(credentials_path, "r") as f:
-        credentials = json.load(f)
-
-    conn = psycopg2.connect(
-        dbname=credentials["database"],
-        user=credentials["username"],
-        host=credentials["hostname"],
-        password=credentials["password"],
-    )
+    pool = postgres_client.get_pool(credentials_path)
+    conn = pool.getconn()
     cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
-    app = spotify_client.SpotifyClient.get_credentials(credentials_path)
+    app = spotify_client.SpotifyClient.get_credentials(
+        credentials_path, credentials=postgres_client.load_credentials(credentials_path)
+    )
 
     # Run Pipelines
     beatport_pipeline()
-    spotify_pipeline(conn, cur, app)
+    spotify_pipeline(conn, cur, app, pool)
 
     # Close connection after running script
+    app.close()
     cur.close()
-    conn.close()
+    pool.putconn(conn)
+    pool.closeall()
 
     finish = time.perf_counter()
 
-    print(f"Process finished in {round(finish - start, 2)} seconds")
+    logger.info("Process finished in %s seconds", round(finish - start, 2))
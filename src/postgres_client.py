@@ -0,0 +1,48 @@
+import orjson
+import functools
+import psycopg2.pool
+
+
+@functools.lru_cache(maxsize=1)
+def load_credentials(credentials_file: str) -> dict:
+    """
+    Summary: Loads the credentials.json file. The parsed dictionary is cached so
+        repeated calls within the same process do not re-read the file.
+
+    Args:
+        credentials_file (str): string literal of credentials file source path.
+
+    Returns:
+        dict: the contents of the credentials file
+    """
+    with open(credentials_file, "rb") as f:
+        return orjson.loads(f.read())
+
+
+@functools.lru_cache(maxsize=1)
+def get_pool(
+    credentials_file: str, minconn: int = 2, maxconn: int = 16
+) -> psycopg2.pool.ThreadedConnectionPool:
+    """
+    Summary: Creates a Postgres connection pool from the credentials file. The pool
+        is cached so every caller in the same process shares the same connections.
+
+    Args:
+        credentials_file (str): string literal of credentials file source path.
+        minconn (int): number of connections opened when the pool is created.
+        maxconn (int): maximum number of connections the pool can hold.
+
+    Returns:
+        psycopg2.pool.ThreadedConnectionPool: a thread-safe pool of connections.
+            Connections are taken with getconn() and returned with putconn().
+    """
+    credentials = load_credentials(credentials_file)
+
+    return psycopg2.pool.ThreadedConnectionPool(
+        minconn,
+        maxconn,
+        dbname=credentials["database"],
+        user=credentials["username"],
+        host=credentials["hostname"],
+        password=credentials["password"],
+    )
@@ -1,28 +1,476 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
 import urllib.parse
-import json
+import logging
+import orjson
 import os
 import datetime
 import base64
 import webbrowser
+import http.server
 import random
+import re
+import sqlite3
 from unidecode import unidecode
 from collections.abc import Generator
+import concurrent.futures
+import functools
+import threading
 import time
 
 
-class SpotifyTokenException(Exception):
-    def __init__(self, message=None, error_code=None):
-        super().__init__(message)
-        self.error = error_code
+logger = logging.getLogger(__name__)
+
+# A single session is shared by every request so TCP and TLS connections are reused.
+# Server errors of idempotent requests are retried by urllib3. Connection errors and
+# timeouts are not, SpotifyClient._request retries those itself so each attempt goes through
+# the rate limiter and a POST is not resent. 429 is left out on purpose: SpotifyClient pauses
+# every thread on a rate limit instead of retrying one request, and urllib3 cannot refresh
+# the token on a 401.
+# requests already sends "Accept-Encoding: gzip, deflate" and adds "br" when Brotli is
+# installed, so responses arrive compressed without an explicit header
+SESSION = requests.Session()
+SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=32,
+        pool_maxsize=32,
+        max_retries=Retry(
+            total=4,
+            connect=0,
+            read=0,
+            other=0,
+            status=4,
+            backoff_factor=0.5,
+            status_forcelist=[500, 502, 503, 504],
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        ),
+    ),
+)
+
+# Maximum number of concurrent search requests, kept low to avoid Spotify soft bans
+MAX_CONCURRENT_REQUESTS = 10
+
+# Steady request rate of a client and the burst allowed on top of it
+REQUESTS_PER_SECOND = 10.0
+REQUEST_BURST = 20
+
+# Authorization URL of the Authorization Code Flow, only the client ID varies
+AUTH_URL_TEMPLATE = (
+    "https://accounts.spotify.com/authorize?"
+    + urllib.parse.urlencode(
+        {
+            "response_type": "code",
+            "redirect_uri": "http://localhost:7777/callback",
+            "scope": "playlist-modify-public playlist-modify-private",
+        }
+    )
+    + "&client_id={client_id}"
+)
+
+# Spotify endpoints
+API_URL = "https://api.spotify.com/v1"
+TOKEN_ENDPOINT = "https://accounts.spotify.com/api/token"
+PROFILE_ENDPOINT = f"{API_URL}/me"
+SEARCH_ENDPOINT = f"{API_URL}/search"
+AUDIO_FEATURES_ENDPOINT = f"{API_URL}/audio-features"
+RECOMMENDATIONS_ENDPOINT = f"{API_URL}/recommendations"
+
+# Audio features kept from the "Get Track's Audio Features" response
+AUDIO_FEATURES = (
+    "acousticness",
+    "danceability",
+    "energy",
+    "instrumentalness",
+    "liveness",
+    "loudness",
+    "speechiness",
+    "tempo",
+    "time_signature",
+    "valence",
+)
+
+# Search queries do not seem to work when they contain these characters even if properly converted
+REMOVE_LIMITERS = str.maketrans("", "", ":/?#[]@!$&'()*+,;=")
+
+# Featured artists are dropped from the searched title
+FEAT_PATTERN = re.compile(r"\bfeat\b", re.IGNORECASE)
+
+# Tracks that could not be found are searched again after this many seconds, in case
+# they were added to the Spotify catalog since
+MISS_TTL = 30 * 24 * 60 * 60
+
+# Access tokens are refreshed this many seconds before they expire
+TOKEN_EXPIRY_MARGIN = 60
+
+# Every API request is attempted at most this many times
+REQUEST_ATTEMPTS = 5
+# Methods that are safe to send again after the server may have received them.
+# Other methods are only retried when the connection could not be opened
+IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "PUT", "DELETE"))
+# (connect, read) timeouts of API requests in seconds
+REQUEST_TIMEOUT = (10, 10)
+# Exponential backoff used when a response does not say how long to wait.
+# The delay is min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt) plus up to BACKOFF_JITTER of it
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 30.0
+BACKOFF_JITTER = 0.5
+
+
+def _normalize_artist(name: str) -> str:
+    """
+    Summary: Lowercases an artist name and transliterates it to ASCII. Most names are
+        already ASCII, so unidecode is skipped for them.
+
+    Args:
+        name (str): the artist name
+
+    Returns:
+        str: the normalized artist name
+    """
+    name = name.strip().lower()
+    return name if name.isascii() else unidecode(name)
+
+
+def _backoff(attempt: int) -> float:
+    """
+    Summary: Computes the delay before the next attempt of a failed request. The random
+        jitter keeps concurrent threads from retrying at the same moment.
+
+    Args:
+        attempt (int): number of the failed attempt, starting from 0
+
+    Returns:
+        float: the delay in seconds
+    """
+    delay = min(BACKOFF_CAP, BACKOFF_BASE * 2**attempt)
+    return delay * (1 + random.uniform(0, BACKOFF_JITTER))
 
 
-class SpotifyRateException(Exception):
+@functools.lru_cache(maxsize=None)
+def _basic_auth(client_id: str, client_secret: str) -> str:
+    """
+    Summary: Builds the Basic Authorization value of token requests. The value only
+        depends on the app credentials so it is computed once per app.
+
+    Args:
+        client_id (str): Spotify Developer App client ID.
+        client_secret (str): Spotify Developer App client secret.
+
+    Returns:
+        str: "Basic " followed by the base64 encoded "client_id:client_secret"
+    """
+    return "Basic " + base64.b64encode(
+        f"{client_id}:{client_secret}".encode()
+    ).decode("utf-8")
+
+
+class SpotifyException(Exception):
     def __init__(self, message=None, error_code=None):
         super().__init__(message)
         self.error = error_code
 
 
+class SpotifyTokenException(SpotifyException):
+    pass
+
+
+class SpotifyRateException(SpotifyException):
+    pass
+
+
+class SpotifyAPIException(SpotifyException):
+    pass
+
+
+class _CallbackHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Summary: Handles the redirect of the Authorization Code Flow and stores the query
+        parameters of the callback on the server
+    """
+
+    def do_GET(self) -> None:
+        url = urllib.parse.urlparse(self.path)
+        if url.path != "/callback":
+            # e.g. the favicon request of the browser
+            self.send_error(404)
+            return
+
+        self.server.callback_query = urllib.parse.parse_qs(url.query)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.end_headers()
+        self.wfile.write(b"Authentication finished. You may close this tab.")
+
+    def log_message(self, format, *args) -> None:
+        # Keep the callback request out of the console output
+        pass
+
+
+class LeakyBucket:
+    """
+    A thread-safe leaky bucket that spaces requests out to a steady rate. Up to capacity
+    requests can be sent at once after an idle period, later requests wait for their turn.
+
+    Attributes:
+        rate_per_sec (float): number of requests allowed per second.
+        capacity (int): maximum number of requests sent in a burst.
+
+    Methods:
+        acquire():
+            Blocks until the next request may be sent
+    """
+
+    def __init__(self, rate_per_sec: float, capacity: int) -> None:
+        """
+        Summary: Inits LeakyBucket class with a full bucket
+
+        Args:
+            rate_per_sec (float): number of requests allowed per second.
+            capacity (int): maximum number of requests sent in a burst.
+        """
+        self.rate_per_sec = rate_per_sec
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """
+        Summary: Blocks until the next request may be sent. Each caller reserves its slot
+            while holding the lock and sleeps afterwards, so waiting threads do not block
+            each other.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate_per_sec
+            )
+            self._updated = now
+            self._tokens -= 1
+            delay = -self._tokens / self.rate_per_sec if self._tokens < 0 else 0
+
+        if delay > 0:
+            time.sleep(delay)
+
+
+class SpotifyCache:
+    """
+    A persistent SQLite cache of Spotify search results and audio features
+
+    Attributes:
+        cache_file (str): string literal of the SQLite database source path.
+
+    Methods:
+        get_track_id(song_details):
+            Returns the cached Spotify ID of a track
+        set_track_id(song_details, track_id):
+            Stores the Spotify ID of a track
+        is_miss(market, song_details):
+            Checks if a track was searched before without a match
+        set_miss(market, song_details):
+            Stores a track that could not be found
+        clear_misses():
+            Forgets every track that could not be found
+        get_features(track_id_list):
+            Returns the cached audio features of the tracks
+        set_features(features):
+            Stores the audio features of the tracks
+        close():
+            Closes the SQLite connection
+    """
+
+    def __init__(self, cache_file: str) -> None:
+        """
+        Summary: Inits SpotifyCache class and creates the cache tables
+
+        Args:
+            cache_file (str): string literal of the SQLite database source path.
+        """
+        self.cache_file = cache_file
+        # The connection is shared by the search threads so access is serialized
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(cache_file, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS search_cache (key TEXT PRIMARY KEY, track_id TEXT)"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS features_cache (track_id TEXT PRIMARY KEY, features TEXT)"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS search_misses (key TEXT PRIMARY KEY, searched_at INTEGER NOT NULL DEFAULT 0)"
+            )
+            columns = {
+                row[1]
+                for row in self._connection.execute("PRAGMA table_info(search_misses)")
+            }
+            if "searched_at" not in columns:
+                self._connection.execute(
+                    "ALTER TABLE search_misses ADD COLUMN searched_at INTEGER NOT NULL DEFAULT 0"
+                )
+            # Expired misses are dropped so the tracks are searched again
+            self._connection.execute(
+                "DELETE FROM search_misses WHERE searched_at < ?",
+                (int(time.time()) - MISS_TTL,),
+            )
+            # Search results are small, so they are all kept in memory and lookups
+            # during a run do not touch the database
+            self._track_ids = dict(
+                self._connection.execute("SELECT key, track_id FROM search_cache")
+            )
+            self._misses = {
+                key for (key,) in self._connection.execute("SELECT key FROM search_misses")
+            }
+
+    @staticmethod
+    def _search_key(song_details: dict) -> str:
+        """
+        Summary: Normalizes the track title, artist and year into a cache key. Only the year of
+            the release date is kept since the search query only filters on the year, so releases
+            of the same year share one search result.
+
+        Args:
+            song_details (dict): a dictionary containing the values of "title", "year", and "artist".
+
+        Returns:
+            str: the cache key of the track
+        """
+        return "|".join(
+            (
+                song_details["title"].lower().strip(),
+                song_details["artist"].lower().strip(),
+                str(song_details["year"].year),
+            )
+        )
+
+    def get_track_id(self, song_details: dict) -> str | None:
+        """
+        Summary: Retrieves the cached Spotify ID of a track
+
+        Args:
+            song_details (dict): a dictionary containing the values of "title", "year", and "artist".
+
+        Returns:
+            str: The Spotify track ID if the track is cached
+            None: returns None if the track is not cached
+        """
+        return self._track_ids.get(self._search_key(song_details))
+
+    def set_track_id(self, song_details: dict, track_id: str) -> None:
+        """
+        Summary: Stores the Spotify ID of a track
+
+        Args:
+            song_details (dict): a dictionary containing the values of "title", "year", and "artist".
+            track_id (str): The Spotify track ID
+        """
+        key = self._search_key(song_details)
+        with self._lock, self._connection:
+            self._track_ids[key] = track_id
+            self._connection.execute(
+                "INSERT OR REPLACE INTO search_cache (key, track_id) VALUES (?, ?)",
+                (key, track_id),
+            )
+
+    def is_miss(self, market: str, song_details: dict) -> bool:
+        """
+        Summary: Checks if a track was searched before in the market without finding a match
+
+        Args:
+            market (str): country code of the market where the track was searched
+            song_details (dict): a dictionary containing the values of "title", "year", and "artist".
+
+        Returns:
+            bool: True if the track could not be found in a previous search
+        """
+        return f"{market}|{self._search_key(song_details)}" in self._misses
+
+    def set_miss(self, market: str, song_details: dict) -> None:
+        """
+        Summary: Stores a track that could not be found in the market so it is not searched again
+            until MISS_TTL has passed
+
+        Args:
+            market (str): country code of the market where the track was searched
+            song_details (dict): a dictionary containing the values of "title", "year", and "artist".
+        """
+        key = f"{market}|{self._search_key(song_details)}"
+        with self._lock, self._connection:
+            self._misses.add(key)
+            self._connection.execute(
+                "INSERT OR REPLACE INTO search_misses (key, searched_at) VALUES (?, ?)",
+                (key, int(time.time())),
+            )
+
+    def clear_misses(self) -> None:
+        """
+        Summary: Forgets every track that could not be found. Used after the Spotify catalog
+            was updated so the tracks are searched again.
+        """
+        with self._lock, self._connection:
+            self._misses.clear()
+            self._connection.execute("DELETE FROM search_misses")
+
+    def get_features(self, track_id_list: list) -> dict:
+        """
+        Summary: Retrieves the cached audio features of the tracks
+
+        Args:
+            track_id_list (list): A list containing string literals of Spotify track IDs.
+
+        Returns:
+            dict: dictionary of the audio features keyed by the Spotify track ID. Tracks that
+                are not cached are left out.
+        """
+        # Looked up 100 IDs at a time to stay under the SQLite limit on query variables
+        track_id_list = list(track_id_list)
+        chunksize = 100
+        rows = []
+        with self._lock:
+            for i in range(0, len(track_id_list), chunksize):
+                chunk = track_id_list[i : i + chunksize]
+                placeholders = ",".join("?" * len(chunk))
+                rows.extend(
+                    self._connection.execute(
+                        f"SELECT track_id, features FROM features_cache WHERE track_id IN ({placeholders})",
+                        chunk,
+                    )
+                )
+        return {track_id: orjson.loads(features) for track_id, features in rows}
+
+    def set_features(self, features: dict) -> None:
+        """
+        Summary: Stores the audio features of the tracks
+
+        Args:
+            features (dict): dictionary of the audio features keyed by the Spotify track ID.
+        """
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO features_cache (track_id, features) VALUES (?, ?)",
+                [
+                    (track_id, orjson.dumps(track_features))
+                    for track_id, track_features in features.items()
+                ],
+            )
+
+    def close(self) -> None:
+        """
+        Summary: Closes the SQLite connection. Every write is already committed.
+        """
+        with self._lock:
+            self._connection.close()
+
+    def __enter__(self) -> "SpotifyCache":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
 class SpotifyClient:
     """
     A class used to connect to multiple Spotify API endpoints
@@ -34,12 +482,15 @@ class SpotifyClient:
          refresh_token (str): Spotify API refresh token.
          credentials_file (str): string literal of credentials file source path.
          user_id (str): Spotify user ID
+         cache (SpotifyCache): persistent cache of search results and audio features
 
     Methods:
         create_playlist(name, descr, public, collab):
             Creates a Spotify playlist
         search_track(market, song_details, type_, limit, offset):
             Searches a track and returns its Spotify ID
+        search_tracks(market, songs, max_workers):
+            Searches multiple tracks concurrently and returns their Spotify IDs
         add_track(playlist_id, track_id_list):
             Adds tracks to a Spotify playlist
         get_track_features(track_id_list):
@@ -48,6 +499,8 @@ class SpotifyClient:
             Retrieves track recommendations
         get_credentials
             A class function for setting up the class attributes
+        close():
+            Closes the cache of the client
     """
 
     def __init__(
@@ -57,6 +510,10 @@ class SpotifyClient:
         access_token: str,
         refresh_token: str,
         credentials_file: str,
+        expires_at: float = None,
+        user_id: str = None,
+        credentials: dict = None,
+        requests_per_second: float = REQUESTS_PER_SECOND,
     ) -> None:
         """
         Summary: Inits SpotifyClient class
@@ -67,16 +524,79 @@ class SpotifyClient:
             access_token (str): Spotify API access token.
             refresh_token (str): Spotify API refresh token.
             credentials_file (str): string literal of credentials file source path.
+            expires_at (float): Unix time when the access token should be refreshed.
+                If unknown, the token is only refreshed after a 401 response.
+            user_id (str): Spotify user ID saved by a previous run. When not supplied, it is
+                requested from the API and saved the first time it is needed.
+            credentials (dict): the parsed contents of the credentials file. Updates are
+                made to this dictionary and written out, so the file is never read back.
+            requests_per_second (float): steady rate of API requests sent by the client.
         """
         self.client_id = client_id
         self.client_secret = client_secret
         self.access_token = access_token
         self.refresh_token = refresh_token
         self.credentials_file = credentials_file
-        self.user_id = self._get_user_id()
+        if credentials is None:
+            with open(credentials_file, "rb") as f:
+                credentials = orjson.loads(f.read())
+        self._credentials = credentials
+        self.expires_at = expires_at
+        self._rebuild_headers()
+        # Only one thread refreshes the access token at a time
+        self._token_lock = threading.RLock()
+        # Caps the number of requests in flight across all threads using this client
+        self._request_slots = threading.BoundedSemaphore(MAX_CONCURRENT_REQUESTS)
+        # Requests are spaced out to stay under the rate limit instead of reacting to 429s
+        self._bucket = LeakyBucket(requests_per_second, REQUEST_BURST)
+        # A 429 response pauses every thread using this client until Retry-After has passed
+        self._retry_lock = threading.Lock()
+        self._retry_at = 0.0
+        # Recommendations keyed by (seed tracks, market, limit)
+        self._recommendations = {}
+        # Search results and audio features are cached next to the credentials file
+        self.cache = SpotifyCache(
+            os.path.join(os.path.dirname(credentials_file), "spotify_cache.db")
+        )
+        self._user_id = user_id
 
     def __str__(self):
-        return f"A spotify app for user {self.user_id}"
+        return f"A spotify app for user {self._user_id}"
+
+    def close(self) -> None:
+        """
+        Summary: Closes the cache of the client. The client should not be used afterwards.
+        """
+        self.cache.close()
+
+    def __enter__(self) -> "SpotifyClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @property
+    def user_id(self) -> str:
+        """
+        Summary: Spotify user ID of the user. Only creating a playlist needs it, so the
+            profile is requested on first use instead of when the client is created.
+            The user ID never changes for an account, so it is saved and only requested once.
+
+        Returns:
+            str: Spotify user ID of the user
+        """
+        if self._user_id is None:
+            with self._token_lock:
+                if self._user_id is None:
+                    self._user_id = self._get_user_id()
+                    SpotifyClient._save_credentials(
+                        self.access_token,
+                        refresh_token=None,
+                        credentials_file=self.credentials_file,
+                        user_id=self._user_id,
+                        credentials=self._credentials,
+                    )
+        return self._user_id
 
     def _auth_header(self) -> dict:
         """
@@ -85,7 +605,143 @@ class SpotifyClient:
         Returns:
             dict: Authorization parameter of request headers
         """
-        return {"Authorization": f"Bearer {self.access_token}"}
+        self._ensure_token()
+        return self._auth_headers
+
+    def _json_header(self) -> dict:
+        """
+        Summary: Request headers of endpoints that receive a JSON body
+
+        Returns:
+            dict: Authorization and Content-Type parameters of request headers
+        """
+        self._ensure_token()
+        return self._json_headers
+
+    def _rebuild_headers(self) -> None:
+        """
+        Summary: Builds the request headers once per access token instead of once per request
+        """
+        self._auth_headers = {"Authorization": f"Bearer {self.access_token}"}
+        self._json_headers = {
+            **self._auth_headers,
+            "Content-Type": "application/json",
+        }
+
+    def _ensure_token(self) -> None:
+        """
+        Summary: Refreshes the access token shortly before it expires so requests
+            do not have to fail with a 401 response first
+        """
+        if self.expires_at is None or time.time() < self.expires_at:
+            return
+        with self._token_lock:
+            # Another thread may have refreshed the token while this one waited
+            if self.expires_at is not None and time.time() >= self.expires_at:
+                logger.info("Access Token about to expire. Refreshing token")
+                self._refesh_token()
+
+    def _wait_for_rate_limit(self) -> None:
+        """
+        Summary: Sleeps until the pause set by the last rate limited response is over
+        """
+        delay = self._retry_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _rate_limited(self, response: requests.Response, attempt: int = 0) -> None:
+        """
+        Summary: Pauses requests of every thread after a rate limited response, then sleeps
+            until the pause is over. The pause is twice the Retry-After value of the response plus up
+            to BACKOFF_JITTER of it, so throttled threads do not all resume at once, or an exponential
+            backoff if the header is missing.
+
+        Args:
+            response (requests.Response): the response with a 429 status code
+            attempt (int): number of the rate limited attempt, starting from 0
+        """
+        retry_after = response.headers.get("retry-after")
+        if retry_after is not None:
+            retry_time = int(retry_after) * 2  # we really don't want to get banned
+            retry_time *= 1 + random.uniform(0, BACKOFF_JITTER)
+        else:
+            retry_time = _backoff(attempt)
+        with self._retry_lock:
+            self._retry_at = max(self._retry_at, time.monotonic() + retry_time)
+        logger.warning("Rate limit exceeded, sleeping for %.1f seconds", retry_time)
+        self._wait_for_rate_limit()
+
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Summary: Sends a request to the Spotify API with the retry policy shared by every endpoint.
+            Rate limited requests wait for Retry-After, expired tokens are refreshed, and timeouts
+            and connection errors are retried with exponential backoff. Server errors of GET requests
+            are retried by the session. POST requests may have been applied even when the response
+            was lost, so they are only retried after a connect timeout, when the request never
+            reached Spotify.
+
+        Args:
+            method (str): HTTP method of the request
+            url (str): URL of the endpoint
+            **kwargs: passed to requests.Session.request. Requests with a "json" body are sent
+                with a JSON Content-Type header.
+
+        Returns:
+            requests.Response: the first response that is not rate limited or unauthorized
+
+        Raises:
+            SpotifyRateException: The request is still rate limited after REQUEST_ATTEMPTS attempts
+            SpotifyTokenException: The access token is still rejected after REQUEST_ATTEMPTS attempts
+            SpotifyException: The connection still fails after REQUEST_ATTEMPTS attempts, or a POST
+                request failed after it may have reached Spotify
+        """
+        for attempt in range(REQUEST_ATTEMPTS):
+            headers = self._json_header() if "json" in kwargs else self._auth_header()
+            try:
+                with self._request_slots:
+                    self._wait_for_rate_limit()
+                    self._bucket.acquire()
+                    response = SESSION.request(
+                        method, url, headers=headers, timeout=REQUEST_TIMEOUT, **kwargs
+                    )
+            except requests.exceptions.RequestException as e:
+                retryable = isinstance(
+                    e,
+                    (
+                        requests.exceptions.ConnectTimeout,
+                        requests.exceptions.ReadTimeout,
+                        requests.exceptions.ConnectionError,
+                    ),
+                )
+                # e.g. a read timeout of create_playlist could otherwise create a duplicate playlist
+                if method not in IDEMPOTENT_METHODS and not isinstance(
+                    e, requests.exceptions.ConnectTimeout
+                ):
+                    retryable = False
+                if not retryable or attempt == REQUEST_ATTEMPTS - 1:
+                    raise SpotifyException(f"{method} {url} failed: {e}") from e
+                delay = _backoff(attempt)
+                logger.warning(
+                    "Error encountered: %s. Retrying in %.1f seconds (Attempt %s of %s)",
+                    e,
+                    delay,
+                    attempt + 1,
+                    REQUEST_ATTEMPTS,
+                )
+                time.sleep(delay)
+                continue
+
+            if response.status_code == 429:
+                if attempt == REQUEST_ATTEMPTS - 1:
+                    raise SpotifyRateException(response.text, response.status_code)
+                self._rate_limited(response, attempt)
+            elif response.status_code == 401:
+                if attempt == REQUEST_ATTEMPTS - 1:
+                    raise SpotifyTokenException(response.text, response.status_code)
+                logger.info("Access Token expired. Refreshing token")
+                self._refesh_token()
+            else:
+                return response
 
     def _get_user_id(self) -> str:
         """
@@ -95,48 +751,59 @@ class SpotifyClient:
             str: Spotify user ID of the user
 
         Raises:
-            SystemExit: An error occured when refreshing the token
+            SpotifyAPIException: An error occured when retrieving the user profile
         """
-        num_retries = 5
-        for _ in range(num_retries):
-            user_profile = requests.get(
-                "https://api.spotify.com/v1/me", headers=self._auth_header()
-            )
-            if user_profile.status_code == 401:
-                print("Access Token expired. Refreshing token")
-                self._refesh_token()
-                continue
-            elif user_profile.status_code == 200:
-                user_id = user_profile.json()["id"]
-                return user_id
+        user_profile = self._request("GET", PROFILE_ENDPOINT)
+        if user_profile.status_code == 200:
+            user_id = orjson.loads(user_profile.content)["id"]
+            return user_id
 
-        raise SystemExit("Could not refresh token")
+        raise SpotifyAPIException(
+            f"Error in getting user profile: {user_profile.text}", user_profile.status_code
+        )
 
     def _refesh_token(self) -> None:
         """
         Summary: Refreshes access token by sending a POST request to "Spotify Token" endpoint then updates the credentials.json file
         """
-        auth_base64 = base64.b64encode(
-            self.client_id.encode() + b":" + self.client_secret.encode()
-        ).decode("utf-8")
-
-        url = "https://accounts.spotify.com/api/token"
+        url = TOKEN_ENDPOINT
         req_headers = {
             "Content-Type": "application/x-www-form-urlencoded",
-            "Authorization": "Basic " + auth_base64,
+            "Authorization": _basic_auth(self.client_id, self.client_secret),
         }
         req_data = {"grant_type": "refresh_token", "refresh_token": self.refresh_token}
 
-        token_request = requests.post(url, headers=req_headers, data=req_data)
-
-        if token_request.status_code == 200:
-            self.access_token = token_request.json()["access_token"]
-            SpotifyClient._save_credentials(
-                self.access_token,
-                refresh_token=None,
-                credentials_file=self.credentials_file,
-            )
-            # TODO If refresh request fails, ask user to re-authenticate
+        with self._token_lock:
+            try:
+                token_request = SESSION.post(
+                    url, headers=req_headers, data=req_data, timeout=REQUEST_TIMEOUT
+                )
+            except requests.exceptions.RequestException as e:
+                # Treated like a rejected refresh, the next 401 response tries again
+                logger.warning("Could not refresh the access token: %s", e)
+                self.expires_at = None
+                return
+
+            if token_request.status_code == 200:
+                token_request_json = orjson.loads(token_request.content)
+                self.access_token = token_request_json["access_token"]
+                self._rebuild_headers()
+                self.expires_at = (
+                    time.time()
+                    + token_request_json["expires_in"]
+                    - TOKEN_EXPIRY_MARGIN
+                )
+                SpotifyClient._save_credentials(
+                    self.access_token,
+                    refresh_token=None,
+                    credentials_file=self.credentials_file,
+                    expires_at=self.expires_at,
+                    credentials=self._credentials,
+                )
+            else:
+                # Fall back to refreshing after a 401 response
+                self.expires_at = None
+                # TODO If refresh request fails, ask user to re-authenticate
 
     def create_playlist(
         self,
@@ -160,14 +827,10 @@ class SpotifyClient:
             str: string literal of the spotify playlist id
 
         Raises:
-            SystemExit: A response error aside from Rate Limit and Token Exceptions occurred
+            SpotifyAPIException: A response error aside from Rate Limit and Token Exceptions occurred
         """
-        endpoint = f"https://api.spotify.com/v1/users/{self.user_id}/playlists"
+        endpoint = f"{API_URL}/users/{self.user_id}/playlists"
 
-        header = {
-            "Authorization": f"Bearer {self.access_token}",
-            "Content-Type": "application/json",
-        }
         body = {
             "name": name,
             "public": public,
@@ -175,18 +838,15 @@ class SpotifyClient:
             "description": descr,
         }
 
-        playlist = requests.post(endpoint, headers=header, json=body)
+        playlist = self._request("POST", endpoint, json=body)
 
         if playlist.status_code == 201:
-            print("Created playlist")
-            return playlist.json()["id"]
-        elif playlist.status_code == 429:
-            print("Rate limit exceeded")
-            print(json.dumps(playlist.json(), indent=4, sort_keys=True))
-            # TODO Handle this later
+            logger.info("Created playlist")
+            return orjson.loads(playlist.content)["id"]
         else:
-            print(json.dumps(playlist.json(), indent=4, sort_keys=True))
-            raise SystemExit("Error in creating playlist")
+            raise SpotifyAPIException(
+                f"Error in creating playlist: {playlist.text}", playlist.status_code
+            )
 
     def search_track(
         self,
@@ -199,7 +859,9 @@ class SpotifyClient:
         """
         Summary: Searches a track by sending a GET request to "Search for Item" endpoint. It uses the track title
             and year to search for potential tracks. The json response contains a list of potential tracks
-            and each potential is then verified using the track artists.
+            and each potential is then verified using the track artists. Tracks that were found before are
+            returned from the cache without sending a request, and tracks that were not found before in
+            the market are skipped.
 
         Args:
             market (str): country code of the market where the track is available
@@ -214,17 +876,24 @@ class SpotifyClient:
             None: returns None if no tracks were found
 
         Raises:
-            SpotifyRateException: Rate Limit is reached the function is running
-            SpotifyTokenException: Access Token expires while the function is running
-            SystemExit: A response error aside from Rate Limit and Token Exceptions occurred
+            SpotifyRateException: Rate Limit is still reached after REQUEST_ATTEMPTS attempts
+            SpotifyTokenException: Access Token is still rejected after REQUEST_ATTEMPTS attempts
+            SpotifyAPIException: A response error aside from Rate Limit and Token Exceptions occurred
         """
-        remove_limiters = str.maketrans(
-            "", "", ":/?#[]@!$&'()*+,;="
-        )  # API does not seem to work when queries have this even if properly converted
+        if track_id := self.cache.get_track_id(song_details):
+            return track_id
+        if self.cache.is_miss(market, song_details):
+            return None
 
-        query_string = f"track:{song_details['title'].translate(remove_limiters).split('feat')[0]} year:{song_details['year'].year}"
+        title = FEAT_PATTERN.split(song_details["title"].translate(REMOVE_LIMITERS), 1)[0]
+        query_string = f"track:{title} year:{song_details['year'].year}"
 
-        endpoint = "https://api.spotify.com/v1/search"
+        # Artist names are normalized the same way on both sides of the comparison
+        input_artist_set = frozenset(
+            _normalize_artist(artist) for artist in song_details["artist"].split(",")
+        )
+
+        endpoint = SEARCH_ENDPOINT
         params = {
             "q": query_string,
             "type": type_,
@@ -232,164 +901,151 @@ class SpotifyClient:
             "limit": limit,
             "offset": offset,
         }
-        connect_timeout = 10
-        read_timeout = 10
-        MAX_RETRIES = 10
-        retry_count = 0
-        while retry_count < MAX_RETRIES:
-            try:
-                song = requests.get(
-                    endpoint,
-                    params=params,
-                    headers=self._auth_header(),
-                    timeout=(connect_timeout, read_timeout),
+        # Each page is fetched and parsed once, then the next page is followed until a
+        # track with a matching artist is found
+        url, page_params = endpoint, params
+        while url is not None:
+            song = self._request("GET", url, params=page_params)
+            if song.status_code != 200:
+                raise SpotifyAPIException(
+                    f"Error in searching track: {song.text}", song.status_code
                 )
 
-                if song.status_code == 200:
-                    while True:
-                        try:
-                            items = song.json()["tracks"]["items"]
-                        except KeyError:
-                            return None  # The API sometimes returns a response even though it doesn't have tracks
-                        if len(items) > 0:
-                            # Check if artist matches
-                            match_index = None
-                            for index, item in enumerate(items):
-                                result_artist_set = set()
-
-                                try:
-                                    artists = item["artists"]
-                                except TypeError:
-                                    # The Spotify web API does return arrays with null objects in them.
-                                    # Often the reason is because the content is not available in the specified market.
-                                    return None
-
-                                for artist in artists:
-                                    result_artist_set.add(
-                                        unidecode(artist["name"].lower())
-                                    )
-
-                                input_artist_set = set(
-                                    song_details["artist"].lower().split(", ")
-                                )
-                                artist_match = input_artist_set.intersection(
-                                    result_artist_set
-                                )
-
-                                if len(artist_match) > 0:
-                                    match_index = index
-                                    break
-
-                            # Matching track is assumed correct
-                            if match_index is not None:
-                                print(
-                                    f"{song_details['title']}: {items[match_index]['external_urls']['spotify']}"
-                                )
-                                return items[match_index]["id"]
-                            else:
-                                next_endpoint = song.json()["tracks"]["next"]
-                                if next_endpoint is None:  # No more items to return
-                                    print(
-                                        f"{song_details['title']}: Did not find the track"
-                                    )
-                                    return None
-                                else:
-                                    try:
-                                        temp = requests.get(
-                                            next_endpoint, headers=self._auth_header()
-                                        )
-                                        if temp.status_code == 429:
-                                            raise SpotifyRateException
-                                        elif temp.status_code == 401:
-                                            raise SpotifyTokenException
-                                    except SpotifyRateException:
-                                        retry_time = (
-                                            int(temp.headers.get("retry-after", 1)) * 2
-                                        )  # we really don't want to get banned
-                                        print(
-                                            f"Rate limit exceeded, sleeping for {retry_time} seconds"
-                                        )
-                                        time.sleep(retry_time)
-                                    except SpotifyTokenException:
-                                        print("Access Token expired. Refreshing token")
-                                        self._refesh_token()
-                                        continue
-                                    else:
-                                        song = temp
-                                    finally:
-                                        continue
-                        else:
-                            print(f"{song_details['title']}: Did not find the track")
-                            return None
-                elif song.status_code == 429:
-                    raise SpotifyRateException
-                elif song.status_code == 401:
-                    raise SpotifyTokenException
-                elif song.status_code == 500:
-                    print(json.dumps(song.json(), indent=4, sort_keys=True))
-                    time.sleep(3)
-                    continue
-                else:
-                    print(json.dumps(song.json(), indent=4, sort_keys=True))
-                    raise SystemExit("An error occurred")
-            except (
-                requests.exceptions.ConnectTimeout,
-                requests.exceptions.ReadTimeout,
-                requests.exceptions.ConnectionError,
-            ) as e:
-                print(f"Error encountered: {e}")
-                retry_count += 1
-                print(f"Retrying... (Attempt {retry_count} of {MAX_RETRIES})")
-                time.sleep(5)
-                continue
-            except SpotifyRateException:
-                retry_time = (
-                    int(song.headers.get("retry-after", 1)) * 2
-                )  # we really don't want to get banned
-                print(f"Rate limit exceeded, sleeping for {retry_time} seconds")
-                time.sleep(retry_time)
-            except SpotifyTokenException:
-                print("Access Token expired. Refreshing token")
-                self._refesh_token()
-                continue
+            try:
+                tracks = orjson.loads(song.content)["tracks"]
+                items = tracks["items"]
+            except KeyError:
+                return None  # The API sometimes returns a response even though it doesn't have tracks
+            if not items:
+                break
+
+            # Check if artist matches. Matching track is assumed correct
+            for item in items:
+                try:
+                    artists = item["artists"]
+                except TypeError:
+                    # The Spotify web API does return arrays with null objects in them.
+                    # Often the reason is because the content is not available in the specified market.
+                    return None
+
+                if not input_artist_set.isdisjoint(
+                    _normalize_artist(artist["name"]) for artist in artists
+                ):
+                    logger.info(
+                        "%s: %s", song_details["title"], item["external_urls"]["spotify"]
+                    )
+                    self.cache.set_track_id(song_details, item["id"])
+                    return item["id"]
+
+            # The next URL already contains the query parameters
+            url, page_params = tracks["next"], None
+
+        logger.info("%s: Did not find the track", song_details["title"])
+        self.cache.set_miss(market, song_details)
+        return None
+
+    def search_tracks(
+        self, market: str, songs: list, max_workers: int = MAX_CONCURRENT_REQUESTS
+    ) -> list:
+        """
+        Summary: Searches multiple tracks concurrently through search_track. The searches are
+            network bound so they are spread across a thread pool instead of being sent one by one.
+            A search that fails with a SpotifyException (an API, rate limit, token or connection error)
+            is logged and counted as not found, so the rest of the batch is kept.
+
+        Args:
+            market (str): country code of the market where the tracks are available
+            songs (list): a list of dictionaries containing the values of "title", "year", and "artist".
+            max_workers (int): maximum number of concurrent searches. Kept low to avoid being rate limited.
+
+        Returns:
+            list: The Spotify track IDs of the tracks that were found, in the same order as songs
+        """
+        # Charts often share tracks, so each song is only searched once. The key is the
+        # cache key, since the search result only depends on the title, artist and year
+        unique_songs = {}
+        for song in songs:
+            unique_songs.setdefault(SpotifyCache._search_key(song), song)
+
+        def search(song: dict) -> str | None:
+            try:
+                return self.search_track(market, song)
+            except SpotifyException as e:
+                logger.error("%s: %s", song["title"], e)
+                return None
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            found = dict(zip(unique_songs, executor.map(search, unique_songs.values())))
+
+        track_ids = [found[SpotifyCache._search_key(song)] for song in songs]
+        return [track_id for track_id in track_ids if track_id is not None]
 
     def add_track(self, playlist_id: str, track_id_list: list) -> None:
         """
-        Summary: Adds tracks to a Spotfiy playlist by sending a POST request to "Add Items to Playlist" endpoint
+        Summary: Adds tracks to a Spotfiy playlist by sending a POST request to "Add Items to Playlist" endpoint.
+            Tracks are sent in chunks of 100, the maximum number of items the endpoint accepts per request.
 
         Args:
             playlist_id (str): string literal of the Spotify playlist ID where tracks will be added
             track_id_list (list): a list containing Spotify track IDs
 
         Raises:
-            SystemExit: A response error aside from Rate Limit and Token Exceptions occurred
+            SpotifyAPIException: A response error aside from Rate Limit and Token Exceptions occurred
         """
-        endpoint = f"https://api.spotify.com/v1/playlists/{playlist_id}/tracks"
-
-        header = {
-            "Authorization": f"Bearer {self.access_token}",
-            "Content-Type": "application/json",
-        }
-        body = {
-            "uris": list(
-                map(lambda track_id: "spotify:track:" + track_id, track_id_list)
-            ),
-            "position": 0,
-        }
-        add_request = requests.post(endpoint, headers=header, json=body)
-        if add_request.status_code == 201:
-            print("Added tracks to playlist")
-        elif add_request.status_code == 429:
-            print("Rate limit exceeded")
-            print(json.dumps(add_request.json(), indent=4, sort_keys=True))
-            # TODO Handle this later
-        else:
-            print(json.dumps(add_request.json(), indent=4, sort_keys=True))
-            raise SystemExit("Error in adding tracks")
+        endpoint = f"{API_URL}/playlists/{playlist_id}/tracks"
+
+        uris = [f"spotify:track:{track_id}" for track_id in track_id_list]
+
+        # The endpoint accepts at most 100 URIs per request
+        chunksize = 100
+        for position in range(0, len(uris), chunksize):
+            body = {
+                "uris": uris[position : position + chunksize],
+                "position": position,
+            }
+            add_request = self._request("POST", endpoint, json=body)
+            if add_request.status_code == 201:
+                logger.info("Added tracks to playlist")
+            else:
+                raise SpotifyAPIException(
+                    f"Error in adding tracks: {add_request.text}", add_request.status_code
+                )
 
     def get_track_features(
         self, track_id_list: list
     ) -> Generator[dict, None, None] | Generator[None, None, None]:
+        """
+        Summary: Retrieves the Spotify audio features of the tracks. Features that were retrieved before are
+            read from the cache and only the remaining tracks are requested from the API, 100 IDs per request.
+
+        Args:
+            track_id_list (str): A list containing string literals of Spotify track IDs.
+
+        Yields:
+            dict: dictionary of  the audio features of each track. The dictionary is empty if the track does not
+                have audio features.
+
+        Raises:
+            SpotifyAPIException: A response error aside from Rate Limit and Token Exceptions occurred
+        """
+        if track_id_list is None:
+            return None
+
+        cached = self.cache.get_features(track_id_list)
+        missing = [track_id for track_id in track_id_list if track_id not in cached]
+
+        # The endpoint accepts at most 100 IDs per request
+        fetched = {}
+        chunksize = 100
+        for i in range(0, len(missing), chunksize):
+            chunk_features = self._request_track_features(missing[i : i + chunksize])
+            self.cache.set_features(chunk_features)
+            fetched.update(chunk_features)
+
+        for track_id in track_id_list:
+            yield dict(cached.get(track_id) or fetched.get(track_id) or {})
+
+    def _request_track_features(self, track_id_list: list) -> dict:
         """
         Summary: Retrieves the Spotify audio features by sending a GET request to "Get Track's Audio Features" endpoint.
             Caution should be used when using this function as the endpoint is easily rate limited.
@@ -398,180 +1054,175 @@ class SpotifyClient:
             track_id_list (str): A list containing string literals of Spotify track IDs. The maximum number of IDs in the
                 list is strictly 100.
 
-        Yields:
-            dict: dictionary of  the audio features of each track.
-            None: If the track does not have audio features.
+        Returns:
+            dict: dictionary of the audio features of each track keyed by the Spotify track ID.
+                Tracks without audio features are left out.
 
         Raises:
-            SpotifyRateException: Rate Limit is reached the function is running
-            SpotifyTokenException: Access Token expires while the function is running
-            SystemExit: A response error aside from Rate Limit and Token Exceptions occurred
+            SpotifyRateException: Rate Limit is still reached after REQUEST_ATTEMPTS attempts
+            SpotifyTokenException: Access Token is still rejected after REQUEST_ATTEMPTS attempts
+            SpotifyAPIException: A response error aside from Rate Limit and Token Exceptions occurred
         """
-        endpoint = f"https://api.spotify.com/v1/audio-features"
-
-        if track_id_list is None:
-            return None
+        endpoint = AUDIO_FEATURES_ENDPOINT
 
         params = {"ids": ",".join(track_id_list)}
-        MAX_RETRIES = 10
-        retry_count = 0
-        while retry_count < MAX_RETRIES:
-            try:
-                features_response = requests.get(
-                    endpoint, params=params, headers=self._auth_header()
-                )
+        features_response = self._request("GET", endpoint, params=params)
 
-                if features_response.status_code == 200:
-                    features = features_response.json()
-                    for feature in features["audio_features"]:
-                        if feature is not None:
-                            features_dict = {
-                                "acousticness": feature["acousticness"],
-                                "danceability": feature["danceability"],
-                                "energy": feature["energy"],
-                                "instrumentalness": feature["instrumentalness"],
-                                "liveness": feature["liveness"],
-                                "loudness": feature["loudness"],
-                                "speechiness": feature["speechiness"],
-                                "tempo": feature["tempo"],
-                                "time_signature": feature["time_signature"],
-                                "valence": feature["valence"],
-                            }
-                            yield features_dict
-                        else:
-                            yield {}
-                    break
-                elif features_response.status_code == 429:
-                    print(features_response.json())
-                    raise SpotifyRateException
-                elif features_response.status_code == 401:
-                    raise SpotifyTokenException
-                else:
-                    print(json.dumps(features_response.json(), indent=4))
-                    raise SystemExit("Error in getting track features")
-            except SpotifyRateException:
-                retry_time = (
-                    int(features_response.headers.get("retry-after", 1)) * 2
-                )  # we really don't want to get banned
-                print(f"Rate limit exceeded, sleeping for {retry_time} seconds")
-                time.sleep(retry_time)
-            except SpotifyTokenException:
-                print("Access Token expired. Refreshing token")
-                self._refesh_token()
-                continue
-            except (
-                requests.exceptions.ConnectTimeout,
-                requests.exceptions.ReadTimeout,
-                requests.exceptions.ConnectionError,
-            ) as e:
-                print(f"Error encountered: {e}")
-                retry_count += 1
-                print(f"Retrying... (Attempt {retry_count} of {MAX_RETRIES})")
-                time.sleep(5)
-                continue
+        if features_response.status_code != 200:
+            raise SpotifyAPIException(
+                f"Error in getting track features: {features_response.text}",
+                features_response.status_code,
+            )
+
+        features = orjson.loads(features_response.content)
+        return {
+            track_id: {key: feature[key] for key in AUDIO_FEATURES}
+            for track_id, feature in zip(track_id_list, features["audio_features"])
+            if feature is not None
+        }
 
     def get_recommendations(
-        self, market: str, track_id_list: list, limit: int = 50
+        self,
+        market: str,
+        track_id_list: list,
+        limit: int = 50,
+        seed_rng: random.Random = None,
     ) -> list:
         """
         Summary: Generates track recommendation by sending a GET request to "Get Recommendations" endpoint.
-            This function only uses track seeds to generate recommendations.
+            This function only uses track seeds to generate recommendations. Responses are cached per
+            client, so repeating a request with the same seeds does not call the API again.
 
         Args:
             market (str): country code of the market where the tracks are available.
-            track_id_list (list): list of Spotify track IDs to be used as seeds. A maximum of 5 IDs may be included.
+            track_id_list (list): list of Spotify track IDs to choose the seeds from. At most 5 IDs are used.
             limit (int): target size of the list of recommended tracks. Values should range from 1-100.
+            seed_rng (random.Random): random number generator used to pick the seeds. Passing a seeded
+                generator makes the picked seeds, and therefore the request, reproducible.
 
         Returns:
             list: A list containing the Spotify track IDs of the recommended tracks
 
         Raises:
-            SystemExit: A response error aside from Rate Limit and Token Exceptions occurred
+            SpotifyAPIException: A response error aside from Rate Limit and Token Exceptions occurred
         """
-        seed_track = random.sample(track_id_list, 5)
-        endpoint = "https://api.spotify.com/v1/recommendations"
+        # Duplicate IDs would waste seed slots. dict.fromkeys keeps the order so a seeded
+        # seed_rng picks the same seeds on every run
+        unique_ids = list(dict.fromkeys(track_id_list))
+        seed_track = (seed_rng or random).sample(unique_ids, min(5, len(unique_ids)))
 
-        params = {"seed_tracks": ",".join(seed_track), "limit": limit, market: market}
-        reco_request = requests.get(
-            endpoint, params=params, headers=self._auth_header()
-        )
+        cache_key = (frozenset(seed_track), market, limit)
+        if cache_key in self._recommendations:
+            return list(self._recommendations[cache_key])
+
+        endpoint = RECOMMENDATIONS_ENDPOINT
+
+        params = {"seed_tracks": ",".join(seed_track), "limit": limit, "market": market}
+        reco_request = self._request("GET", endpoint, params=params)
 
         if reco_request.status_code == 200:
-            reco_track_ids = []
-            reco_tracks = reco_request.json()["tracks"]
-            for track in reco_tracks:
-                reco_track_ids.append(track["id"])
-            print(f"Recommending {len(reco_track_ids)} tracks")
-            return reco_track_ids
-        elif reco_request.status_code == 429:
-            print("Rate limit exceeded")
-            print(json.dumps(reco_request.json(), indent=4, sort_keys=True))
-            # TODO Handle this later
+            reco_tracks = orjson.loads(reco_request.content)["tracks"]
+            reco_track_ids = [track["id"] for track in reco_tracks]
+            logger.info("Recommending %s tracks", len(reco_track_ids))
+            self._recommendations[cache_key] = reco_track_ids
+            return list(reco_track_ids)
         else:
-            print(json.dumps(reco_request.json(), indent=4, sort_keys=True))
-            raise SystemExit("An error occured")
+            raise SpotifyAPIException(
+                f"Error in getting recommendations: {reco_request.text}",
+                reco_request.status_code,
+            )
 
     @classmethod
-    def get_credentials(cls, credentials_file: str) -> "SpotifyClient":
+    def get_credentials(
+        cls, credentials_file: str, credentials: dict = None
+    ) -> "SpotifyClient":
         """
         Summary: Retrieves the Spotify API credentials from the credentials.json file
             and sets up the class attributes.
 
         Args:
             credentials_file (str): string literal of credentials file source path.
+            credentials (dict): the already parsed contents of the credentials file.
+                The file is only read when this is not supplied.
 
         Returns:
             SpotifyClient: returns an instance of the class
         """
-        with open(credentials_file, "r") as f:
-            credentials = json.load(f)
+        if credentials is None:
+            with open(credentials_file, "rb") as f:
+                credentials = orjson.loads(f.read())
 
         client_id = credentials["sptfy_id"]
         client_secret = credentials["sptfy_secret"]
         access_token = credentials["access_token"]
         refresh_token = credentials["refresh_token"]
+        expires_at = credentials.get("expires_at")
+        user_id = credentials.get("user_id")
 
         if access_token is None:
             auth_code = SpotifyClient._request_auth(client_id)
-            access_token, refresh_token = SpotifyClient._request_new_token(
-                client_id, client_secret, auth_code, credentials_file
+            access_token, refresh_token, expires_at = SpotifyClient._request_new_token(
+                client_id, client_secret, auth_code, credentials_file, credentials
             )
 
         return cls(
-            client_id, client_secret, access_token, refresh_token, credentials_file
+            client_id,
+            client_secret,
+            access_token,
+            refresh_token,
+            credentials_file,
+            expires_at,
+            user_id,
+            credentials,
         )
 
     @staticmethod
     def _request_auth(client_id: str) -> str:
         """
         Summary: Authenticates the user through the Authorization Code Flow. The user will be redirected to a website where the "code"
-            parameter should be retrieved from the callback. The "code" parameter should then inputted when asked by the program.
+            parameter is captured from the callback by a local server. If the callback port is in use, the "code" parameter
+            should be inputted when asked by the program instead.
 
         Args:
             client_id (str): The Spotify Developer App Client ID
 
         Returns:
             str: returns the auth_code if the user accepts the authentication
+
+        Raises:
+            SystemExit: The user did not accept the authentication
         """
-        _auth_headers = {
-            "client_id": client_id,
-            "response_type": "code",
-            "redirect_uri": "http://localhost:7777/callback",
-            "scope": "playlist-modify-public playlist-modify-private",
-        }
+        try:
+            server = http.server.HTTPServer(("localhost", 7777), _CallbackHandler)
+        except OSError:
+            server = None
 
         webbrowser.open(
-            "https://accounts.spotify.com/authorize?"
-            + urllib.parse.urlencode(_auth_headers)
+            AUTH_URL_TEMPLATE.format(client_id=urllib.parse.quote(client_id))
         )
 
-        auth_code = input("Please enter callback code: ")
+        if server is None:
+            return input("Please enter callback code: ")
+
+        with server:
+            server.callback_query = None
+            while server.callback_query is None:
+                server.handle_request()
+
+        if "code" not in server.callback_query:
+            raise SystemExit("Authentication was not accepted")
+
+        auth_code = server.callback_query["code"][0]
 
         return auth_code
 
     @staticmethod
     def _request_new_token(
-        client_id: str, client_secret: str, auth_code: str, credentials_file: str
+        client_id: str,
+        client_secret: str,
+        auth_code: str,
+        credentials_file: str,
+        credentials: dict = None,
     ) -> tuple:
         """
         Summary: Requests for an Access Token by sending a POST request to "Token" endpoint. Function then stores
@@ -582,21 +1233,17 @@ class SpotifyClient:
             client_secret (str): Spotify Developer App client secret.
             auth_code (str): Temporary authetication code.
             credentials_file (str): string literal of credentials file source path.
+            credentials (dict): the parsed contents of the credentials file.
 
         Returns:
-            tuple: The tuple (access_token, refresh_token) is returned
+            tuple: The tuple (access_token, refresh_token, expires_at) is returned
 
         Raises:
-            SystemExit: A response error other than 200 occurred
+            SystemExit: A response error other than 200 occurred, or the request failed
         """
-
-        auth_base64 = base64.b64encode(
-            client_id.encode() + b":" + client_secret.encode()
-        ).decode("utf-8")
-
-        url = "https://accounts.spotify.com/api/token"
+        url = TOKEN_ENDPOINT
         req_headers = {
-            "Authorization": "Basic " + auth_base64,
+            "Authorization": _basic_auth(client_id, client_secret),
             "Content-Type": "application/x-www-form-urlencoded",
         }
         req_data = {
@@ -605,42 +1252,75 @@ class SpotifyClient:
             "redirect_uri": "http://localhost:7777/callback",
         }
 
-        token_request = requests.post(url, headers=req_headers, data=req_data)
+        try:
+            token_request = SESSION.post(
+                url, headers=req_headers, data=req_data, timeout=REQUEST_TIMEOUT
+            )
+        except requests.exceptions.RequestException as e:
+            raise SystemExit(f"Failed to get access token: {e}") from e
         if token_request.status_code == 200:
-            token_request_json = token_request.json()
+            token_request_json = orjson.loads(token_request.content)
 
             access_token = token_request_json["access_token"]
             refresh_token = token_request_json["refresh_token"]
+            expires_at = (
+                time.time() + token_request_json["expires_in"] - TOKEN_EXPIRY_MARGIN
+            )
 
             SpotifyClient._save_credentials(
-                access_token, refresh_token, credentials_file
+                access_token,
+                refresh_token,
+                credentials_file,
+                expires_at,
+                credentials=credentials,
             )
         else:
             raise SystemExit("Failed to get access token")
 
-        return access_token, refresh_token
+        return access_token, refresh_token, expires_at
 
     @staticmethod
     def _save_credentials(
-        access_token: str, refresh_token: str, credentials_file: str
+        access_token: str,
+        refresh_token: str,
+        credentials_file: str,
+        expires_at: float = None,
+        user_id: str = None,
+        credentials: dict = None,
     ) -> None:
         """
-        Summary: Saves the access_token and refresh_token to the credentials.json file
+        Summary: Saves the access_token and refresh_token to the credentials.json file. The
+            file is written to a temporary file first and then swapped in, so an interrupted
+            write cannot leave a corrupted credentials file behind.
 
         Args:
             access_token (str): Spotify API access token.
             refresh_token (str): Spotify API refresh token.
             credentials_file (str): string literal of credentials file source path.
+            expires_at (float): Unix time when the access token should be refreshed.
+            user_id (str): Spotify user ID of the user.
+            credentials (dict): the parsed contents of the credentials file. It is updated
+                in place. The file is only read when this is not supplied.
         """
-        with open(credentials_file, "r") as f:
-            credentials = json.load(f)
+        if credentials is None:
+            with open(credentials_file, "rb") as f:
+                credentials = orjson.loads(f.read())
 
         credentials["access_token"] = access_token
         if refresh_token is not None:
             credentials["refresh_token"] = refresh_token
-
-        with open(credentials_file, "w") as f:
-            json.dump(credentials, f, indent=4)
+        if expires_at is not None:
+            credentials["expires_at"] = expires_at
+        if user_id is not None:
+            credentials["user_id"] = user_id
+
+        temp_file = credentials_file + ".tmp"
+        with open(temp_file, "wb") as f:
+            f.write(orjson.dumps(credentials, option=orjson.OPT_INDENT_2))
+            # The new contents must be on disk before they replace the old file
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, credentials_file)
 
 
 if __name__ == "__main__":